@@ -6,11 +6,9 @@ import {
   ModalBody,
   ModalFooter,
   Button,
-  Image,
-  Link,
 } from '@heroui/react';
-import api from '@/lib/api';
-import { use, useEffect, useState } from 'react';
+import TaskResult from '@/components/task-result';
+import { use } from 'react';
 import { useRouter } from 'next/navigation';
 
 export default function TaskModal({
@@ -20,19 +18,6 @@ export default function TaskModal({
 }) {
   const router = useRouter();
   const { id } = use(params);
-  const [imageUrl, setImageUrl] = useState<string | null>(null);
-
-  useEffect(() => {
-    const fetchImage = async () => {
-      const {
-        data: { outputUrl },
-      } = await api.get<{ outputUrl: string }>(`/tasks/${id}`);
-
-      setImageUrl(outputUrl);
-    };
-
-    fetchImage();
-  }, [id]);
 
   return (
     <Modal
@@ -45,19 +30,12 @@ export default function TaskModal({
           <>
             <ModalHeader>Processed Image</ModalHeader>
             <ModalBody className="flex items-center">
-              <Image
-                src={imageUrl!}
-                alt="Processed Image"
-                className="w-full min-w-xs max-w-md"
-              />
+              <TaskResult id={id} />
             </ModalBody>
             <ModalFooter>
               <Button color="danger" variant="light" onPress={onClose}>
                 Close
               </Button>
-              <Button color="primary" as={Link} href={imageUrl!}>
-                Download
-              </Button>
             </ModalFooter>
           </>
         )}
@@ -38,9 +38,13 @@ export default function SRForm({
         },
       });
 
+      // the task is queued, the task page waits for it to finish
       addToast({
-        title: 'Success',
-        description: `Image processed successfully! Saved to ${data.outputUrl}.`,
+        title: data.status === 'finished' ? 'Success' : 'Queued',
+        description:
+          data.status === 'finished'
+            ? `Image processed successfully! Saved to ${data.outputUrl}.`
+            : 'The image is queued for processing.',
         color: 'success',
       });
       router.push(`/tasks/${data.id}`);
@@ -122,7 +126,7 @@ export default function SRForm({
           ? uploadProgress === undefined
             ? 'Starting...'
             : uploadProgress >= 1
-            ? 'Processing...'
+            ? 'Queueing...'
             : `Uploading... ${Math.round(uploadProgress * 100)}%`
           : 'Start'}
       </Button>
@@ -0,0 +1,52 @@
+'use client';
+import { Button, Image, Link, Progress } from '@heroui/react';
+import { notFound } from 'next/navigation';
+import { HttpStatusCode, isAxiosError } from 'axios';
+import { useTask } from '@/lib/task';
+
+export default function TaskResult({ id }: { id: string }) {
+  const { task, error } = useTask(id);
+
+  if (error) {
+    if (isAxiosError(error) && error.status == HttpStatusCode.NotFound)
+      notFound();
+
+    throw error;
+  }
+
+  if (task?.status === 'finished' && task.outputUrl)
+    return (
+      <>
+        <Image
+          src={task.outputUrl}
+          alt="Processed Image"
+          className="w-full min-w-xs max-w-md"
+        />
+        <Button color="primary" as={Link} href={task.outputUrl} fullWidth>
+          Download
+        </Button>
+      </>
+    );
+
+  if (task?.status === 'error')
+    return <p className="text-danger">Processing failed: {task.error}</p>;
+
+  if (task?.status === 'cancel') return <p>The task was cancelled.</p>;
+
+  const progress = task?.progress?.progress;
+  return (
+    <Progress
+      className="w-full min-w-xs max-w-md"
+      label={
+        task?.status === 'processing'
+          ? `Processing... ETA ${task.progress?.eta_str}`
+          : task?.status === 'paused'
+          ? 'Paused for a higher priority task...'
+          : 'Waiting in queue...'
+      }
+      value={progress == null ? undefined : progress * 100}
+      isIndeterminate={progress == null}
+      showValueLabel={progress != null}
+    />
+  );
+}
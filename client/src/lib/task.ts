@@ -0,0 +1,104 @@
+'use client';
+import { useEffect, useState } from 'react';
+import api from '@/lib/api';
+
+export type TaskStatus =
+  | 'queued'
+  | 'processing'
+  | 'paused'
+  | 'finished'
+  | 'error'
+  | 'cancel';
+
+export interface TaskProgress {
+  status: TaskStatus;
+  progress: number | null;
+  eta_str: string;
+}
+
+export interface Task {
+  id: string;
+  status: TaskStatus;
+  /** set once the task is finished */
+  outputUrl?: string;
+  error?: string;
+  /** only while the task is live */
+  progress?: TaskProgress;
+}
+
+const DONE_STATES: TaskStatus[] = ['finished', 'error', 'cancel'];
+const POLL_INTERVAL = 1000;
+
+/**
+ * Follows a task until it is finished, failed or cancelled.
+ * `/run_process` answers as soon as the task is queued, the output exists once `status` is `finished`.
+ * Updates come from the `/tasks/{id}/events` stream, `/tasks/{id}` is polled when the stream fails
+ * or the browser has no `EventSource`.
+ */
+export function useTask(id: string) {
+  const [task, setTask] = useState<Task>();
+  const [error, setError] = useState<unknown>();
+
+  useEffect(() => {
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    let source: EventSource | undefined;
+    let stopped = false;
+
+    const poll = async () => {
+      try {
+        const { data } = await api.get<Task>(`/tasks/${id}`);
+        if (stopped) return;
+        setTask(data);
+        if (!DONE_STATES.includes(data.status))
+          timer = setTimeout(poll, POLL_INTERVAL);
+      } catch (error) {
+        if (!stopped) setError(error);
+      }
+    };
+
+    const listen = () => {
+      source = new EventSource(
+        `${process.env.NEXT_PUBLIC_BASE_URL}/tasks/${id}/events`,
+      );
+      source.addEventListener('progress', (event) => {
+        const progress: TaskProgress = JSON.parse(event.data);
+        setTask((task) => task && { ...task, status: progress.status, progress });
+      });
+      // the last event is named after the final status and carries the whole task
+      for (const status of DONE_STATES) {
+        source.addEventListener(status, (event) => {
+          source?.close();
+          setTask(JSON.parse(event.data));
+        });
+      }
+      source.onerror = () => {
+        source?.close();
+        if (!stopped) timer = setTimeout(poll, POLL_INTERVAL);
+      };
+    };
+
+    // the first request also answers 404 for unknown ids, which the stream cannot report
+    const start = async () => {
+      try {
+        const { data } = await api.get<Task>(`/tasks/${id}`);
+        if (stopped) return;
+        setTask(data);
+        if (DONE_STATES.includes(data.status)) return;
+        if (typeof EventSource === 'undefined')
+          timer = setTimeout(poll, POLL_INTERVAL);
+        else listen();
+      } catch (error) {
+        if (!stopped) setError(error);
+      }
+    };
+
+    start();
+    return () => {
+      stopped = true;
+      clearTimeout(timer);
+      source?.close();
+    };
+  }, [id]);
+
+  return { task, error };
+}
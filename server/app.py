@@ -1,9 +1,33 @@
+import time
+from contextlib import asynccontextmanager
+
+import_started = time.perf_counter()
+
 from fastapi import FastAPI
-from config import is_production
-from routers import health, models, run_process, status, tasks
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from config import MAX_ARCHIVE_SIZE, MAX_FILE_SIZE, is_production
+from core.models import model_registry
+from core.task_store import task_store
+from core.warmup import startup
+from routers import batch, cache, health, models, run_process, status, tasks
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # pick up models added to or removed from models/ without a restart
+    model_registry.watch()
+    # index task folders and remove expired ones
+    task_store.start()
+    # import the inference stack and warm up warmupModels, /health/ready turns true when done
+    startup.start()
+    yield
+    model_registry.stop_watch()
+    task_store.stop()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 if not is_production:
     from fastapi.middleware.cors import CORSMiddleware
@@ -17,8 +41,72 @@ if not is_production:
     from fastapi.staticfiles import StaticFiles
     app.mount("/static/tasks", StaticFiles(directory="tasks"), name="tasks")
 
+# request bodies above these are refused before the form is parsed
+UPLOAD_LIMITS = {"/run_process": MAX_FILE_SIZE, "/batch": MAX_ARCHIVE_SIZE}
+# room for the other form fields and the multipart boundaries
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadLimitMiddleware:
+    """413 for upload bodies above UPLOAD_LIMITS, before they are spooled.
+
+    A Content-Length above the limit is refused without reading the body.
+    Otherwise (chunked uploads) the body is counted as it is received: once
+    it passes the limit the 413 is sent, the app sees a disconnect and
+    whatever it answers after that is dropped.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        limit = UPLOAD_LIMITS.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+        limit += FORM_OVERHEAD
+        detail = {"detail": f"File size exceeds limit of {(limit - FORM_OVERHEAD) / (1024 * 1024)} MB."}
+
+        length = Headers(scope=scope).get("content-length", "")
+        if length.isdigit() and int(length) > limit:
+            return await JSONResponse(status_code=413, content=detail)(scope, receive, send)
+
+        received = 0
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    await JSONResponse(status_code=413, content=detail)(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # the app failing on the disconnect, the client already has its 413
+            if not rejected:
+                raise
+
+
+app.add_middleware(UploadLimitMiddleware)
+
+
+app.include_router(batch.router)
+app.include_router(cache.router)
 app.include_router(health.router)
 app.include_router(models.router)
 app.include_router(run_process.router)
 app.include_router(status.router)
 app.include_router(tasks.router)
+
+startup.record("app_import", time.perf_counter() - import_started)
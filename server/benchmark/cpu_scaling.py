@@ -0,0 +1,67 @@
+"""CPU scaling curve of parallel tile execution.
+
+For every core count from 1 to --max-cores, runs tile_process with the
+thread plan from core.thread_plan and reports tiles/s. Each output is
+compared with the sequential single-thread output and must be identical.
+
+    python -m benchmark.cpu_scaling --model models/real-esrgan/x4/model.onnx --scale 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from core.onnx_infer import OnnxSRInfer
+from core.thread_plan import plan_cpu_execution
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--scale", type=int, default=4)
+    parser.add_argument("--tile", type=int, default=192)
+    parser.add_argument("--size", type=int, default=768, help="input image side")
+    parser.add_argument("--max-cores", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    img = np.random.default_rng(0).integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    providers = ["CPUExecutionProvider"]
+
+    sequential = OnnxSRInfer(args.model, args.scale, "seq", providers=providers, intra_op_threads=1)
+    reference = sequential.tile_process(img, args.tile)
+    tiles = len(sequential.tile_boxes(args.size, args.size, args.tile, 16))
+
+    identical = True
+    print("cores  intra  workers  tiles/s  speedup")
+    base_rate = None
+    for cores in range(1, args.max_cores + 1):
+        plan = plan_cpu_execution(cores, args.tile)
+        sr = OnnxSRInfer(
+            args.model,
+            args.scale,
+            "plan",
+            providers=providers,
+            batch_size=plan.batch_size,
+            tile_workers=plan.tile_workers,
+            intra_op_threads=plan.intra_op_threads,
+        )
+        sr.tile_process(img, args.tile)  # warm up
+        start = time.perf_counter()
+        output = sr.tile_process(img, args.tile)
+        rate = tiles / (time.perf_counter() - start)
+        base_rate = base_rate or rate
+        same = np.array_equal(output, reference)
+        identical &= same
+        print(
+            f"{cores:5d}  {plan.intra_op_threads:5d}  {plan.tile_workers:7d}  {rate:7.2f}  {rate / base_rate:6.2f}x"
+            + ("" if same else "  output differs")
+        )
+    if not identical:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
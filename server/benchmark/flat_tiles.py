@@ -0,0 +1,72 @@
+"""Quality guard for flat tile skipping.
+
+Upscales an image with and without flat_tile_variance and compares the two
+outputs. Exits with status 1 when the PSNR of the skipping path against the
+full model path drops below --min-psnr. Without --image a synthetic
+illustration (flat background, a few shapes, light noise) is used.
+
+    python -m benchmark.flat_tiles --model models/real-esrgan/x4/model.onnx --scale 4
+"""
+
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from core.onnx_infer import OnnxSRInfer
+
+
+def synthetic_illustration(size: int = 512) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    img = np.full((size, size, 3), (235, 220, 250), dtype=np.uint8)
+    cv2.circle(img, (size // 3, size // 3), size // 6, (40, 90, 200), -1)
+    cv2.rectangle(img, (size // 2, size // 2), (size - 40, size - 80), (30, 30, 30), 3)
+    cv2.putText(img, "MoeSR", (20, size - 20), cv2.FONT_HERSHEY_SIMPLEX, 2, (0, 0, 0), 4)
+    noise = rng.normal(0, 0.5, img.shape)
+    return np.clip(img + noise, 0, 255).astype(np.uint8)
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else 10 * np.log10(255.0**2 / mse)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--scale", type=int, default=4)
+    parser.add_argument("--image")
+    parser.add_argument("--tile", type=int, default=192)
+    parser.add_argument("--variance", type=float, default=1.0)
+    parser.add_argument("--min-psnr", type=float, default=40.0)
+    parser.add_argument("--providers", nargs="+", default=["CPUExecutionProvider"])
+    args = parser.parse_args()
+
+    if args.image:
+        img = cv2.imdecode(np.fromfile(args.image, dtype=np.uint8), cv2.IMREAD_COLOR)
+    else:
+        img = synthetic_illustration()
+
+    full = OnnxSRInfer(args.model, args.scale, "full", providers=args.providers)
+    start = time.perf_counter()
+    full_img = full.universal_process_pipeline(img, args.tile)
+    full_seconds = time.perf_counter() - start
+
+    skip = OnnxSRInfer(args.model, args.scale, "skip", providers=args.providers, flat_tile_variance=args.variance)
+    start = time.perf_counter()
+    skip_img = skip.universal_process_pipeline(img, args.tile)
+    skip_seconds = time.perf_counter() - start
+
+    quality = psnr(full_img, skip_img)
+    total = skip.skipped_tiles + skip.inferred_tiles
+    print(f"skipped {skip.skipped_tiles}/{total} tiles, est. saved {skip.saved_seconds:.2f}s")
+    print(f"full {full_seconds:.2f}s, skipping {skip_seconds:.2f}s, PSNR {quality:.2f} dB")
+    if quality < args.min_psnr:
+        print(f"PSNR below {args.min_psnr} dB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
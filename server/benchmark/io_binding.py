@@ -0,0 +1,61 @@
+"""Check and time the IOBinding path of OnnxSRInfer against sess.run.
+
+Upscales the same image with io_binding off and on, exits with status 1
+when the outputs differ. Without --image a random image is used, so edge
+tiles of several shapes are covered.
+
+    python -m benchmark.io_binding --model models/real-esrgan/x4/model.onnx --scale 4
+"""
+
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from core.onnx_infer import OnnxSRInfer
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--scale", type=int, default=4)
+    parser.add_argument("--image")
+    parser.add_argument("--tile", type=int, default=192)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--providers", nargs="+", default=["CPUExecutionProvider"])
+    args = parser.parse_args()
+
+    if args.image:
+        img = cv2.imdecode(np.fromfile(args.image, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    else:
+        img = np.random.default_rng(0).integers(0, 256, (500, 700, 4), dtype=np.uint8)
+
+    outputs = {}
+    for io_binding in (False, True):
+        sr = OnnxSRInfer(
+            args.model,
+            args.scale,
+            "io_binding" if io_binding else "run",
+            providers=args.providers,
+            batch_size=args.batch,
+            tile_workers=args.workers,
+            io_binding=io_binding,
+        )
+        # warm up kernels / engines
+        sr.universal_process_pipeline(img, args.tile)
+        start = time.perf_counter()
+        outputs[io_binding] = sr.universal_process_pipeline(img, args.tile)
+        print(f"io_binding={io_binding}: {time.perf_counter() - start:.3f}s on {sr.sess.get_providers()[0]}")
+
+    if not np.array_equal(outputs[False], outputs[True]):
+        diff = np.abs(outputs[False].astype(np.int16) - outputs[True]).max()
+        print(f"outputs differ, max difference {diff}")
+        sys.exit(1)
+    print("outputs are identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""Benchmark suite of the inference engine, no model weights needed.
+
+Builds a tiny random-weight ONNX SR model per scale and synthetic RGB/RGBA
+images, then runs process_image over every combination of --sizes, --tiles,
+--scales and --channels. Per case it records the end-to-end latency, tiles/s,
+the time of every stage and the peak memory, and writes all of it to --out.
+
+Stages: decode (load_image), pad (tile padding and normalization into the
+session input, infer_tiles minus the session), infer (session run), merge
+(copying tiles into the canvas), encode (save_image). ``other`` is the rest
+of upscale_image (tile slicing, alpha handling, flat tile checks).
+Timings are the fastest of --repeat runs after a warm-up run; the peak
+memory comes from one extra run under tracemalloc (numpy buffers included,
+onnxruntime arenas are not).
+
+With --compare, cases are matched against an earlier result file and the
+command exits with status 1 when one got slower by more than --tolerance.
+
+    python -m benchmark.suite --out bench.json
+    python -m benchmark.suite --out new.json --compare bench.json --tolerance 0.1
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+
+STAGES = ("decode", "pad", "infer", "merge", "encode", "other")
+
+
+def make_model(path: Path, scale: int, features: int = 16) -> None:
+    """Conv-ReLU-Conv-DepthToSpace SR model with random weights and a dynamic batch dim"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(0)
+    w1 = numpy_helper.from_array((rng.standard_normal((features, 3, 3, 3)) * 0.2).astype(np.float32), "w1")
+    w2 = numpy_helper.from_array(
+        (rng.standard_normal((3 * scale * scale, features, 3, 3)) * 0.2).astype(np.float32), "w2"
+    )
+    nodes = [
+        helper.make_node("Conv", ["input", "w1"], ["c1"], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["c1"], ["r1"]),
+        helper.make_node("Conv", ["r1", "w2"], ["c2"], pads=[1, 1, 1, 1]),
+        helper.make_node("DepthToSpace", ["c2"], ["d"], blocksize=scale, mode="CRD"),
+        helper.make_node("Sigmoid", ["d"], ["output"]),
+    ]
+    graph = helper.make_graph(
+        nodes,
+        "sr",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["n", 3, "h", "w"])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["n", 3, "H", "W"])],
+        [w1, w2],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 17)])
+    model.ir_version = 8
+    path.parent.mkdir(parents=True, exist_ok=True)
+    onnx.save(model, path)
+
+
+def make_image(size: int, channels: int) -> np.ndarray:
+    """Flat areas, edges and noise, with a gradient alpha for 4 channels"""
+    rng = np.random.default_rng(size)
+    img = np.full((size, size, 3), (230, 215, 245), dtype=np.uint8)
+    cv2.circle(img, (size // 3, size // 3), size // 6, (40, 90, 200), -1)
+    cv2.rectangle(img, (size // 2, size // 2), (size - size // 8, size - size // 6), (30, 30, 30), 3)
+    img[size // 2 :, : size // 2] = rng.integers(0, 256, (size - size // 2, size // 2, 3), dtype=np.uint8)
+    if channels == 4:
+        alpha = np.tile(np.linspace(0, 255, size, dtype=np.uint8), (size, 1))
+        img = np.dstack([img, alpha])
+    return img
+
+
+def instrument(sr, timings: dict) -> None:
+    """Accumulate the pad, infer and merge time of an OnnxSRInfer instance into timings"""
+    run_session = sr.run_session
+    infer_tiles = sr.infer_tiles
+    write_tile = sr.write_tile
+
+    def timed_run_session(batch):
+        start = time.perf_counter()
+        output = run_session(batch)
+        timings["infer"] += time.perf_counter() - start
+        return output
+
+    def timed_infer_tiles(imgs, height, width):
+        start = time.perf_counter()
+        infer = timings["infer"]
+        output = infer_tiles(imgs, height, width)
+        timings["pad"] += time.perf_counter() - start - (timings["infer"] - infer)
+        return output
+
+    def timed_write_tile(canvas, out_box, tile_box, output_tile):
+        start = time.perf_counter()
+        write_tile(canvas, out_box, tile_box, output_tile)
+        timings["merge"] += time.perf_counter() - start
+
+    sr.run_session = timed_run_session
+    sr.infer_tiles = timed_infer_tiles
+    sr.write_tile = timed_write_tile
+
+
+def run_case(sr, model, input_path: Path, output_path: Path, tile: int, scale: int) -> tuple[dict, int]:
+    """One process_image run split into its stages, returns (seconds per stage, tiles)"""
+    from core.process import load_image, save_image, upscale_image
+
+    timings = defaultdict(float)
+    instrument(sr, timings)
+    tiles = sr.inferred_tiles + sr.skipped_tiles + sr.reused_tiles
+
+    # the three steps of process_image, timed one by one
+    start = time.perf_counter()
+    img = load_image(input_path)
+    decoded = time.perf_counter()
+    img_out, _ = upscale_image(sr, img, output_path.parent, tile, scale, model)
+    upscaled = time.perf_counter()
+    save_image(img_out, output_path)
+    end = time.perf_counter()
+
+    timings["decode"] = decoded - start
+    timings["encode"] = end - upscaled
+    timings["other"] = max(upscaled - decoded - timings["pad"] - timings["infer"] - timings["merge"], 0.0)
+    timings["total"] = end - start
+    return dict(timings), sr.inferred_tiles + sr.skipped_tiles + sr.reused_tiles - tiles
+
+
+def case_key(result: dict) -> tuple:
+    return result["size"], result["tile"], result["scale"], result["channels"]
+
+
+def compare(results: list[dict], baseline_path: Path, tolerance: float) -> bool:
+    """Print the change of every case against the baseline file, False when one regressed"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {case_key(r): r for r in json.load(f)["results"]}
+    ok = True
+    print("size  tile  scale  ch  before(s)  after(s)  change")
+    for r in results:
+        before = baseline.get(case_key(r))
+        if before is None:
+            continue
+        change = r["seconds"]["total"] / before["seconds"]["total"] - 1
+        regressed = change > tolerance
+        ok = ok and not regressed
+        print(
+            f"{r['size']:4d}  {r['tile']:4d}  {r['scale']:5d}  {r['channels']:2d}  "
+            f"{before['seconds']['total']:9.4f}  {r['seconds']['total']:8.4f}  {change:+7.1%}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 512, 1024], help="input image sides")
+    parser.add_argument("--tiles", type=int, nargs="+", default=[128, 256])
+    parser.add_argument("--scales", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--channels", type=int, nargs="+", choices=[3, 4], default=[3, 4], help="RGB / RGBA")
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--providers", nargs="+", default=["CPUExecutionProvider"])
+    parser.add_argument("--format", default="png", help="output image format")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--out", type=Path, default=Path("benchmark.json"))
+    parser.add_argument("--compare", type=Path, help="earlier result file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed slowdown, 0.1 = 10%%")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="moesr-bench-"))
+    # core.models scans BASE_PATH/models on import, keep the real models out of the run unless set
+    os.environ.setdefault("BASE_PATH", str(workdir))
+    (Path(os.environ["BASE_PATH"]) / "models").mkdir(parents=True, exist_ok=True)
+
+    from core.onnx_infer import OnnxSRInfer
+    from core.tuning import host_fingerprint
+    from schemas import ModelInfo
+
+    models = {}
+    for scale in args.scales:
+        path = workdir / "bench" / f"x{scale}" / "random.onnx"
+        make_model(path, scale)
+        models[scale] = ModelInfo(name="random", path=str(path), scale=scale, algo="bench")
+
+    inputs = {}
+    for size, channels in itertools.product(args.sizes, args.channels):
+        inputs[size, channels] = workdir / f"input_{size}_{channels}.png"
+        cv2.imencode(".png", make_image(size, channels))[1].tofile(inputs[size, channels])
+
+    results = []
+    for size, tile, scale, channels in itertools.product(args.sizes, args.tiles, args.scales, args.channels):
+        model = models[scale]
+        output_path = workdir / f"output.{args.format}"
+        runs = []
+        for i in range(args.repeat + 1):
+            # a fresh instance per run, the instrumented methods stay per run
+            sr = OnnxSRInfer(
+                model.path, scale, model.name, providers=args.providers,
+                batch_size=args.batch, tile_workers=args.workers,
+            )
+            seconds, tiles = run_case(sr, model, inputs[size, channels], output_path, tile, scale)
+            # the first run builds the kernels for the tile shapes
+            if i:
+                runs.append(seconds)
+        seconds = min(runs, key=lambda s: s["total"])
+
+        sr = OnnxSRInfer(
+            model.path, scale, model.name, providers=args.providers,
+            batch_size=args.batch, tile_workers=args.workers,
+        )
+        tracemalloc.start()
+        run_case(sr, model, inputs[size, channels], output_path, tile, scale)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        upscale = seconds["total"] - seconds["decode"] - seconds["encode"]
+        result = {
+            "size": size,
+            "tile": tile,
+            "scale": scale,
+            "channels": channels,
+            "tiles": tiles,
+            "tilesPerSecond": round(tiles / upscale, 2) if upscale > 0 else None,
+            "seconds": {k: round(seconds[k], 5) for k in (*STAGES, "total")},
+            "peakMemoryMB": round(peak / 1024 / 1024, 2),
+        }
+        results.append(result)
+        print(
+            f"{size}px tile {tile} x{scale} {'RGBA' if channels == 4 else 'RGB'}: "
+            f"{seconds['total']:.4f}s, {result['tilesPerSecond']} tiles/s, {result['peakMemoryMB']} MB"
+        )
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "host": host_fingerprint(),
+        "created": time.time(),
+        "providers": args.providers,
+        "batch": args.batch,
+        "workers": args.workers,
+        "format": args.format,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"results written to {args.out}")
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
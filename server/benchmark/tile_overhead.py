@@ -0,0 +1,98 @@
+"""Per-tile overhead of OnnxSRInfer outside sess.run.
+
+The session is replaced by a stub that returns a preallocated output, so the
+timings only contain the numpy/cv2 work around the model call. The legacy
+path is the per-tile code tile_process used before the hot path rework.
+
+    python -m benchmark.tile_overhead [--tile 192] [--scale 4] [--batch 1]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from core.onnx_infer import OnnxSRInfer
+
+
+class _Input:
+    shape = ["N", 3, "h", "w"]
+
+
+class StubSession:
+    """Stands in for ort.InferenceSession, sess.run costs nothing"""
+
+    def __init__(self, scale: int) -> None:
+        self.scale = scale
+        self.outputs: dict[tuple[int, ...], np.ndarray] = {}
+
+    def get_inputs(self):
+        return [_Input()]
+
+    def run(self, output_names, input_feed):
+        n, c, h, w = input_feed["input"].shape
+        key = (n, c, h * self.scale, w * self.scale)
+        if key not in self.outputs:
+            self.outputs[key] = np.random.default_rng(0).random(key, dtype=np.float32)
+        # real sessions return a fresh array each call
+        return [self.outputs[key].copy()]
+
+
+class StubCache:
+    def __init__(self, scale: int) -> None:
+        self.sess = StubSession(scale)
+
+    def get(self, model_path, providers, provider_options=None, intra_op_threads=None):
+        return self.sess
+
+
+def legacy_tile_process(sr: OnnxSRInfer, img: np.ndarray, tile_size: int, tile_pad: int = 16) -> np.ndarray:
+    height, width, channel = img.shape
+    output = np.zeros((height * sr.scale, width * sr.scale, channel), dtype=np.float32)
+    for (in_y0, in_y1, in_x0, in_x1), (out_y0, out_y1, out_x0, out_x1), (t_y0, t_y1, t_x0, t_x1) in sr.tile_boxes(
+        height, width, tile_size, tile_pad
+    ):
+        tile = img[in_y0:in_y1, in_x0:in_x1, :]
+        tile = np.array(tile).astype(np.float32) / 255.0
+        tile = np.transpose(tile, (2, 0, 1))
+        tile = np.expand_dims(tile, axis=0)
+        tile_sr = sr.sess.run(["output"], {"input": tile})[0]
+        tile_sr = np.squeeze(tile_sr)
+        tile_sr = np.transpose(tile_sr, (1, 2, 0))
+        tile_sr = (tile_sr * 255.0).clip(0, 255).astype(np.uint8)
+        tile_sr = cv2.cvtColor(tile_sr, cv2.COLOR_RGB2BGR)
+        output[out_y0:out_y1, out_x0:out_x1, :] = tile_sr[t_y0:t_y1, t_x0:t_x1, :]
+    return output
+
+
+def bench(fn, repeat: int) -> float:
+    fn()  # warm up buffers
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tile", type=int, default=192)
+    parser.add_argument("--scale", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=1)
+    parser.add_argument("--size", type=int, default=768, help="input image side")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sr = OnnxSRInfer("stub", args.scale, "stub", batch_size=args.batch, session_cache=StubCache(args.scale))
+    img = np.random.default_rng(0).integers(0, 256, (args.size, args.size, 3), dtype=np.uint8)
+    tiles = len(sr.tile_boxes(args.size, args.size, args.tile, 16))
+
+    legacy = bench(lambda: legacy_tile_process(sr, img, args.tile), args.repeat)
+    current = bench(lambda: sr.tile_process(img, args.tile), args.repeat)
+    print(f"{tiles} tiles of {args.tile}px, x{args.scale}, batch {args.batch}")
+    print(f"legacy : {legacy / tiles * 1000:.2f} ms/tile")
+    print(f"current: {current / tiles * 1000:.2f} ms/tile")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,40 @@ from pathlib import Path
 # Global Vars
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
+MAX_ARCHIVE_SIZE = 2 * 1024 * 1024 * 1024  # 2GB, zip uploads of /batch
+maxOutputPixels = 16384 * 16384  # output pixels of one image (or frame), larger jobs are rejected with 413
+modelMaxOutputPixels: dict[str, int] = {}  # "algo:name" -> maxOutputPixels override, e.g. lower for heavy models
 gpuid = 0
 tileSize = 192
+tileBatchSize = 4  # tiles per session call, models with a fixed batch of 1 ignore this
+flatTileVariance = None  # e.g. 1.0: tiles with a lower per-channel variance are resized instead of inferred, check with benchmark.flat_tiles first
+largeImagePixels = 8192 * 8192  # output pixels above which tiles go to a memory-mapped canvas
 inputType = "Image"
+outputFormat = "png"  # png, webp or jpg (drops alpha) for still images and batch entries
+pngCompression = 3  # 0-9, higher is smaller and slower
+webpQuality = 90  # 1-100, above 100 is lossless
+jpegQuality = 95  # 0-100
+encodeWorkers = 2  # threads encoding and writing outputs while the next job is inferred
+sessionCacheSize = 4  # warm inference sessions kept in memory
+sessionCacheMaxBytes = 2 * 1024 * 1024 * 1024  # 2GB, estimated from model file sizes
+workerCount = 1  # jobs processed concurrently
+warmupModels: list[str] = []  # "algo:name" models whose sessions are built and run once at startup
+variantMinPsnr = None  # dB, when set jobs run the fastest fp16/int8 variant above it (core.variants report)
+ioBinding = False  # run tiles through IOBindings with preallocated buffers instead of sess.run, not yet verified on GPU
+cpuThreadPlan = True  # without CUDA/TensorRT, split the cores between concurrent tiles (core.thread_plan)
+maxQueueDepth = 16  # waiting jobs before /run_process answers 429
+jobPreemption = True  # a running job pauses at a tile boundary while queued jobs of a higher priority run
+progressHistorySize = 1000  # finished tasks kept in the in-memory progress store
+resultCacheMaxBytes = 5 * 1024 * 1024 * 1024  # 5GB of cached outputs
+taskMaxAge = 7 * 24 * 3600  # seconds a finished task folder is kept, None keeps them
+taskMaxBytes = 50 * 1024 * 1024 * 1024  # 50GB of task folders, the oldest are removed above it, None disables
+taskCollectInterval = 600  # seconds between task folder collections, None disables the collector
+animationFrameTolerance = 2  # max per pixel difference for an animation frame to reuse the previous output, None disables
+modelRescanInterval = 30  # seconds between rescans of models/ for added, changed or removed files, None disables
+progressEventRate = 4  # max progress events per second on /tasks/{id}/events
 
 # From env
 base_url = os.getenv("BASE_URL", "http://localhost:9000/static")
 base_path = Path(os.getenv("BASE_PATH", "./"))
 is_production = os.getenv("production") == "true"
+batchFolderRoot = Path(os.getenv("BATCH_FOLDER_ROOT", base_path / "batch"))  # server-side folders /batch may read
@@ -0,0 +1,137 @@
+"""Animated GIF/WebP decoding and streaming encoding.
+
+Frames are decoded one at a time with Pillow and handed out as BGR/BGRA
+uint8 arrays, like ``cv2.imdecode`` gives single images. Writers take the
+frames in order: GIF frames are written to the file as they come, WebP
+frames are spooled to disk and read back one by one by the encoder, so
+neither side holds the whole animation in memory.
+"""
+
+import tempfile
+from collections.abc import Iterator
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import GifImagePlugin, Image, ImageSequence
+
+from config import webpQuality
+from .utils import ANIMATED_SUFFIXES
+
+
+def is_animated(path: str | Path) -> bool:
+    try:
+        with Image.open(path) as im:
+            return getattr(im, "is_animated", False)
+    except OSError:
+        return False
+
+
+def animation_info(path: str | Path) -> dict:
+    with Image.open(path) as im:
+        return {
+            "frames": getattr(im, "n_frames", 1),
+            "loop": im.info.get("loop", 0),
+            "alpha": im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info,
+        }
+
+
+def read_frames(path: str | Path, alpha: bool) -> Iterator[tuple[np.ndarray, int]]:
+    """(BGR/BGRA frame, duration in ms) of every frame, decoded lazily"""
+    with Image.open(path) as im:
+        for frame in ImageSequence.Iterator(im):
+            # converting loads the frame, the duration is only set after that for WebP
+            rgb = np.asarray(frame.convert("RGBA" if alpha else "RGB"))
+            duration = frame.info.get("duration") or 100
+            yield cv2.cvtColor(rgb, cv2.COLOR_RGBA2BGRA if alpha else cv2.COLOR_RGB2BGR), duration
+
+
+class GifWriter:
+    """Writes every frame straight to the file with its own palette."""
+
+    def __init__(self, path: str | Path, loop: int = 0) -> None:
+        self.file = open(path, "wb")
+        self.loop = loop
+        self.frames = 0
+
+    def add(self, frame: np.ndarray, duration: int) -> None:
+        rgb = Image.fromarray(cv2.cvtColor(frame[:, :, 0:3], cv2.COLOR_BGR2RGB))
+        quantized = rgb.quantize(255)
+        indices = np.array(quantized)
+        params = {"duration": duration, "include_color_table": True}
+        if frame.shape[2] == 4:
+            # GIF has 1 bit alpha, index 255 is kept free for it
+            indices[frame[:, :, 3] < 128] = 255
+            params.update(transparency=255, disposal=2)
+        palette = quantized.getpalette()[: 255 * 3]
+        paletted = Image.fromarray(indices, "P")
+        paletted.putpalette(palette + [0] * (768 - len(palette)))
+        if not self.frames:
+            header, _ = GifImagePlugin.getheader(paletted, None, {"loop": self.loop})
+            self.file.writelines(header)
+        self.file.writelines(GifImagePlugin.getdata(paletted, **params))
+        self.frames += 1
+
+    def close(self) -> None:
+        self.file.write(b";")
+        self.file.close()
+
+
+class _SpooledFrames(Image.Image):
+    """Multi-frame image over frame files, only the current frame is loaded"""
+
+    def __init__(self, paths: list[Path]) -> None:
+        super().__init__()
+        self.paths = paths
+        self.n_frames = len(paths)
+        self.frame = 0
+        self.seek(0)
+
+    def seek(self, frame: int) -> None:
+        with Image.open(self.paths[frame]) as im:
+            im.load()
+            self.im = im.im
+            self._mode = im.mode
+            self._size = im.size
+        self.frame = frame
+
+    def tell(self) -> int:
+        return self.frame
+
+
+class WebPWriter:
+    """Spools frames as PNG files, encodes them one by one on close."""
+
+    def __init__(self, path: str | Path, loop: int = 0) -> None:
+        self.path = path
+        self.loop = loop
+        self.spool = tempfile.TemporaryDirectory(dir=Path(path).parent)
+        self.paths: list[Path] = []
+        self.durations: list[int] = []
+
+    def add(self, frame: np.ndarray, duration: int) -> None:
+        frame_path = Path(self.spool.name) / f"{len(self.paths)}.png"
+        cv2.imwrite(str(frame_path), frame, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+        self.paths.append(frame_path)
+        self.durations.append(duration)
+
+    def close(self) -> None:
+        try:
+            _SpooledFrames(self.paths).save(
+                self.path,
+                format="WEBP",
+                save_all=True,
+                duration=self.durations,
+                loop=self.loop,
+                # like still images, a quality above 100 is lossless
+                quality=min(webpQuality, 100),
+                lossless=webpQuality > 100,
+            )
+        finally:
+            self.spool.cleanup()
+
+
+def open_writer(path: str | Path, loop: int = 0) -> GifWriter | WebPWriter:
+    if Path(path).suffix == ".gif":
+        return GifWriter(path, loop)
+    return WebPWriter(path, loop)
@@ -0,0 +1,150 @@
+import io
+import time
+import zipfile
+from collections.abc import Callable
+from pathlib import Path, PurePosixPath
+
+import numpy as np
+
+from config import ALLOWED_EXTENSIONS, MAX_FILE_SIZE, base_path, outputFormat
+from schemas import ModelInfo
+from .image_io import decode_image, encode_image, read_image_header
+from .models import max_output_pixels, model_registry
+from .onnx_infer import OnnxSRInfer
+from .pipeline import run_pipeline
+from .process import PlanRunner, target_size
+from .progress import TaskProgress
+from .scale_plan import plan_scale
+from .utils import PeakRss
+
+
+META_INTERVAL = 1.0  # seconds between meta updates of a running batch
+
+
+def is_image_name(name: str) -> bool:
+    return PurePosixPath(name).suffix.lower().lstrip(".") in ALLOWED_EXTENSIONS
+
+
+class BatchSource:
+    """Image files of a zip archive or of a server-side folder, in name order"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.archive = zipfile.ZipFile(path) if path.is_file() else None
+        if self.archive is not None:
+            entries = {i.filename: i.file_size for i in self.archive.infolist() if not i.is_dir()}
+        else:
+            entries = {
+                f.relative_to(path).as_posix(): f.stat().st_size for f in path.rglob("*") if f.is_file()
+            }
+        self.sizes = {name: size for name, size in sorted(entries.items()) if is_image_name(name)}
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.sizes)
+
+    def read(self, name: str) -> bytes:
+        if self.sizes[name] > MAX_FILE_SIZE:
+            raise ValueError(f"File size exceeds limit of {MAX_FILE_SIZE / (1024 * 1024)} MB.")
+        if self.archive is not None:
+            return self.archive.read(name)
+        return (self.path / name).read_bytes()
+
+    def close(self) -> None:
+        if self.archive is not None:
+            self.archive.close()
+
+
+def process_batch(
+    sr_instance: OnnxSRInfer,
+    inputPath: str | Path,
+    output_path: str | Path,
+    tileSize: int,
+    scale: int,
+    model: ModelInfo,
+    resizeTo: str | None = None,
+    progress: TaskProgress | None = None,
+    create_instance: Callable[[ModelInfo], OnnxSRInfer] | None = None,
+    on_update: Callable[[dict], None] | None = None,
+) -> dict:
+    """sr process of every image in a zip archive or folder into an output zip
+
+    Files are decoded on a reader thread and encoded on a writer thread while
+    the current one is upscaled (core.pipeline), all with the same warm
+    instances. Entries are appended to the output zip as they finish, under
+    their input name with the ``outputFormat`` suffix. on_update gets the
+    stats so far at most every ``META_INTERVAL`` seconds; files that fail are
+    reported there and do not stop the batch.
+    """
+    source = BatchSource(base_path / inputPath)
+    names = source.names
+    sr_instance.total_img_num = len(names)
+    instances: dict[str, OnnxSRInfer] = {}
+    files: dict[str, dict] = {}
+    runners: dict[tuple[int, int], PlanRunner] = {}
+    started = time.time()
+    last_update = 0.0
+    megapixels = 0.0
+    pixel_limit = max_output_pixels(model)
+
+    def stats() -> dict:
+        elapsed = time.time() - started
+        done = [f for f in files.values() if f["status"] == "finished"]
+        return {
+            "images": len(names),
+            "imagesDone": len(done),
+            "imagesFailed": len(files) - len(done),
+            "elapsedSeconds": round(elapsed, 3),
+            "imagesPerSecond": round(len(done) / elapsed, 3) if elapsed > 0 else None,
+            "megapixelsPerSecond": round(megapixels / elapsed, 3) if elapsed > 0 else None,
+            "skippedTiles": sum(i.skipped_tiles for i in instances.values()),
+            "savedSeconds": round(sum(i.saved_seconds for i in instances.values()), 3),
+            # a copy: the meta holding it is serialized by /tasks while the writer adds files
+            "files": {name: dict(entry) for name, entry in files.items()},
+        }
+
+    def decode(name: str) -> np.ndarray:
+        data = source.read(name)
+        # reject oversized images before decoding them
+        width, height, _ = read_image_header(io.BytesIO(data))
+        if width * height * scale * scale > pixel_limit:
+            raise ValueError(
+                f"Output of {width * scale}x{height * scale} exceeds the limit of {pixel_limit} pixels."
+            )
+        return decode_image(np.frombuffer(data, dtype=np.uint8))
+
+    def infer(name: str, img: np.ndarray) -> tuple[np.ndarray, float]:
+        start = time.perf_counter()
+        h, w, _ = img.shape
+        runner = runners.get((h, w))
+        if runner is None:
+            target_h, target_w = target_size(h, w, scale, resizeTo)
+            plan = plan_scale(model, h, w, target_h, target_w, model_registry.models if create_instance else None)
+            runner = runners[(h, w)] = PlanRunner(
+                plan, sr_instance, tileSize, Path(output_path).parent, create_instance, instances
+            )
+        img_out, _ = runner.run(img, progress)
+        return img_out, time.perf_counter() - start
+
+    def encode(name: str, result: tuple[np.ndarray, float] | Exception) -> None:
+        nonlocal last_update, megapixels
+        if isinstance(result, Exception):
+            files[name] = {"status": "error", "error": str(result)}
+        else:
+            img_out, seconds = result
+            output_name = str(PurePosixPath(name).with_suffix(f".{outputFormat}"))
+            output_zip.writestr(output_name, encode_image(img_out, outputFormat).tobytes())
+            megapixels += img_out.shape[0] * img_out.shape[1] / 1e6
+            files[name] = {"status": "finished", "output": output_name, "seconds": round(seconds, 3)}
+        sr_instance.processed_img_num += 1
+        if on_update and time.time() - last_update >= META_INTERVAL:
+            last_update = time.time()
+            on_update(stats())
+
+    # the images are already compressed, entries are stored as is
+    with PeakRss() as rss, zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_STORED) as output_zip:
+        try:
+            run_pipeline(names, decode, infer, encode)
+        finally:
+            source.close()
+    return {**stats(), "peakRssMB": rss.mb}
@@ -2,10 +2,10 @@ from schemas import State
 
 
 class StateManager:
+    """Server-wide log of the last state change. Per-task state and progress live in core.progress."""
+
     def __init__(self) -> None:
         self.last_state: State = "idle"
-        self.last_progress: float | None = None
-        self.last_progress_set_time: float | None = None
 
     def show_error(self, error_text: str) -> None:
         # eel.showError(error_text)
@@ -13,9 +13,8 @@ class StateManager:
 
     def set_process_state(self, state: State) -> None:
         # eel.handleSetProcessState(state)
-        global last_state
         print(f"Process State: {state}")
-        last_state = state
+        self.last_state = state
 
 
 state_manager = StateManager()
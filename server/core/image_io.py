@@ -0,0 +1,69 @@
+"""Image decoding and encoding, kept out of core.utils so the web layer loads without cv2"""
+
+import tempfile
+from pathlib import Path
+from typing import BinaryIO
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from config import jpegQuality, pngCompression, webpQuality
+
+
+# 8 bit modes cv2.imdecode turns into BGR/BGRA uint8
+IMAGE_MODES = {"1", "L", "LA", "P", "PA", "RGB", "RGBA", "CMYK", "YCbCr"}
+
+
+def read_image_header(source: Path | BinaryIO) -> tuple[int, int, int]:
+    """(width, height, channels) from the image header, the pixels are not decoded.
+
+    Raises ValueError for unreadable images and modes the pipeline cannot take.
+    """
+    try:
+        with Image.open(source) as im:
+            width, height = im.size
+            mode = im.mode
+            transparent = "transparency" in im.info
+    except (OSError, Image.DecompressionBombError) as e:
+        raise ValueError("Cannot read image header.") from e
+    if mode not in IMAGE_MODES:
+        raise ValueError(f"Unsupported image mode: {mode}.")
+    # channels after cv2.imdecode plus the gray expansion of decode_image
+    channels = 4 if "A" in mode or transparent else 3
+    return width, height, channels
+
+
+def decode_image(data: np.ndarray) -> np.ndarray:
+    """BGR/BGRA image of encoded bytes, gray images are expanded to BGR"""
+    img = cv2.imdecode(data, cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise ValueError("Cannot decode image.")
+    if img.ndim == 2:
+        img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    return img
+
+
+def encode_image(img: np.ndarray, extension: str) -> np.ndarray:
+    """Encoded bytes of a BGR/BGRA image, with the compression settings of the config"""
+    extension = extension.lower().lstrip(".")
+    if extension == "png":
+        params = [cv2.IMWRITE_PNG_COMPRESSION, pngCompression]
+    elif extension == "webp":
+        params = [cv2.IMWRITE_WEBP_QUALITY, webpQuality]
+    elif extension in ("jpg", "jpeg"):
+        params = [cv2.IMWRITE_JPEG_QUALITY, jpegQuality]
+        # no alpha in jpeg
+        img = img[:, :, 0:3]
+    else:
+        raise ValueError(f"Unsupported output format: {extension}")
+    ok, data = cv2.imencode(f".{extension}", img, params)
+    if not ok:
+        raise ValueError(f"Cannot encode image as {extension}.")
+    return data
+
+
+def open_canvas(shape: tuple[int, ...], folder: Path) -> np.memmap:
+    """uint8 image canvas backed by an anonymous temp file, removed once the array is released"""
+    folder.mkdir(parents=True, exist_ok=True)
+    return np.memmap(tempfile.TemporaryFile(dir=folder), dtype=np.uint8, mode="w+", shape=shape)
@@ -0,0 +1,441 @@
+import heapq
+import itertools
+import os
+import queue
+import threading
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from config import (
+    base_path,
+    base_url,
+    cpuThreadPlan,
+    encodeWorkers,
+    flatTileVariance,
+    gpuid,
+    ioBinding,
+    jobPreemption,
+    maxQueueDepth,
+    tileBatchSize,
+    tileSize,
+    workerCount,
+)
+from schemas import ModelInfo, Priority, State
+from .global_state import state_manager
+from .progress import LIVE_STATES, TaskProgress
+from .result_cache import result_cache
+from .session_cache import session_cache
+from .task_store import task_store
+from .thread_plan import plan_cpu_execution
+
+# the inference stack (onnxruntime, cv2, numpy) is imported where a job first
+# needs it, or ahead of the first job by core.warmup, so the web layer starts fast
+if TYPE_CHECKING:
+    from .onnx_infer import OnnxSRInfer
+
+
+# lower runs first
+PRIORITY_RANK = {"high": 0, "normal": 1, "low": 2}
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class JobCancelled(BaseException):
+    """Raised at a tile boundary of a cancelled job.
+
+    Not an Exception, so the per-file error handling of batches
+    (core.pipeline) does not record it and go on with the next file.
+    """
+
+
+@dataclass(slots=True)
+class Job:
+    id: str
+    model: ModelInfo
+    scale: int
+    input_path: Path
+    output_path: Path
+    meta_path: Path
+    meta: dict
+    progress: TaskProgress
+    skip_alpha: bool = False
+    cache_key: str | None = None
+    batch: bool = False
+    # animated GIF/WebP input, upscaled frame by frame
+    animated: bool = False
+    priority: Priority = "normal"
+    state: State = "queued"
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    # input image decoded ahead by the JobQueue feeder, still images only
+    decoded: Future | None = None
+
+    @property
+    def still_image(self) -> bool:
+        return not self.batch and not self.animated
+
+    def set_state(self, state: State, **extra) -> None:
+        self.state = state
+        self.meta["status"] = state
+        self.meta.update(extra)
+        self.progress.set_state(state)
+        task_store.save(self.meta_path, self.meta)
+
+
+def output_url(output_path: Path) -> str:
+    # Ensure output_path is relative to base_path for correct URL
+    rel_output_path = str(Path(output_path).relative_to(base_path))
+    return f"{base_url}/{rel_output_path.replace(os.sep, '/')}"
+
+
+def execution_settings(model: ModelInfo, cpu_plan: bool = True) -> tuple[int, int, int | None]:
+    """(batch size, tile workers, intra-op threads) of the instances create_sr_instance builds.
+
+    Without CUDA/TensorRT the cores are split for ``tileSize`` (core.thread_plan).
+    A tuning profile picks the tile and batch size of every pass instead
+    (PlanRunner), so a profiled model keeps the settings it was tuned with.
+    """
+    import onnxruntime as ort
+
+    from .tuning import load_profile
+
+    available_providers = ort.get_available_providers()
+    gpu = any(p in available_providers for p in ("TensorrtExecutionProvider", "CUDAExecutionProvider"))
+    if cpu_plan and cpuThreadPlan and not gpu and load_profile(model) is None:
+        # the jobs running at the same time share the cores
+        plan = plan_cpu_execution((os.cpu_count() or 1) // workerCount, tileSize)
+        return plan.batch_size, plan.tile_workers, plan.intra_op_threads
+    return tileBatchSize, 1, None
+
+
+def create_sr_instance(model: ModelInfo, progress_setter=None, checkpoint=None, cpu_plan: bool = True) -> "OnnxSRInfer":
+    from .onnx_infer import OnnxSRInfer
+
+    providers = [
+        "TensorrtExecutionProvider",
+        "CUDAExecutionProvider",
+    ]
+    provider_options = None
+    if gpuid >= 0:
+        provider_options = [
+            {
+                "device_id": 0,
+                "trt_fp16_enable": True,
+                "trt_engine_cache_enable": True,
+                "trt_engine_cache_path": "./trt_cache",
+            },
+            {"device_id": gpuid},
+        ]
+    batch_size, tile_workers, intra_op_threads = execution_settings(model, cpu_plan)
+    return OnnxSRInfer(
+        model.path,
+        model.scale,
+        model.name,
+        providers=providers,
+        provider_options=provider_options,
+        progress_setter=progress_setter,
+        batch_size=batch_size,
+        session_cache=session_cache,
+        flat_tile_variance=flatTileVariance,
+        tile_workers=tile_workers,
+        intra_op_threads=intra_op_threads,
+        io_binding=ioBinding,
+        checkpoint=checkpoint,
+    )
+
+
+class JobHeap:
+    """Bounded queue of jobs, the highest priority first and FIFO within a priority"""
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._heap: list[tuple[int, int, Job]] = []
+        # submission order, also keeps the jobs themselves from being compared
+        self._order = itertools.count()
+        self._changed = threading.Condition()
+
+    def put(self, job: Job, block: bool = True) -> None:
+        """Raises queue.Full when the heap is full and block is False"""
+        with self._changed:
+            while len(self._heap) >= self.maxsize:
+                if not block:
+                    raise queue.Full
+                self._changed.wait()
+            heapq.heappush(self._heap, (PRIORITY_RANK[job.priority], next(self._order), job))
+            self._changed.notify_all()
+
+    def get(self) -> Job:
+        with self._changed:
+            while not self._heap:
+                self._changed.wait()
+            job = heapq.heappop(self._heap)[2]
+            self._changed.notify_all()
+            return job
+
+    def wait_for_room(self) -> None:
+        with self._changed:
+            while len(self._heap) >= self.maxsize:
+                self._changed.wait()
+
+    def get_before(self, rank: int) -> Job | None:
+        """The next job if it outranks rank, without waiting"""
+        with self._changed:
+            if not self._heap or self._heap[0][0] >= rank:
+                return None
+            job = heapq.heappop(self._heap)[2]
+            self._changed.notify_all()
+            return job
+
+    def remove(self, job: Job) -> bool:
+        """Take job out of the heap, False if it is not in it"""
+        with self._changed:
+            for i, entry in enumerate(self._heap):
+                if entry[2] is job:
+                    break
+            else:
+                return False
+            self._heap.pop(i)
+            heapq.heapify(self._heap)
+            self._changed.notify_all()
+            return True
+
+    def qsize(self) -> int:
+        return len(self._heap)
+
+    def full(self) -> bool:
+        return len(self._heap) >= self.maxsize
+
+
+class JobQueue:
+    """Bounded priority queue of SR jobs drained by a pool of worker threads.
+
+    Inference runs in onnxruntime with the GIL released, so threads share the
+    warm sessions in ``session_cache`` without the cost of extra processes.
+    Still images go through three overlapping stages: a feeder thread decodes
+    the next jobs (at most ``worker_count`` ahead), the workers infer, and
+    ``encodeWorkers`` threads encode and write the outputs while the workers
+    go on with the next job.
+
+    Jobs run by priority class, FIFO within a class. Between tile batches a
+    running job checks for cancellation, and with ``jobPreemption`` it runs
+    queued jobs of a higher priority first, on the same worker: the job is
+    paused with its finished tiles in its canvas and resumes where it stopped.
+    """
+
+    def __init__(self, worker_count: int, max_depth: int) -> None:
+        self.worker_count = worker_count
+        self.max_depth = max_depth
+        self.jobs: dict[str, Job] = {}
+        self._queue = JobHeap(max_depth)
+        # decoded jobs waiting for a worker
+        self._ready = JobHeap(worker_count)
+        self._workers: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._decoder = ThreadPoolExecutor(1, thread_name_prefix="sr-decode")
+        self._encoder = ThreadPoolExecutor(encodeWorkers, thread_name_prefix="sr-encode")
+        # bounds the upscaled images waiting to be encoded
+        self._encode_slots = threading.Semaphore(encodeWorkers)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._workers:
+                return
+            feeder = threading.Thread(target=self._feed, name="sr-feeder", daemon=True)
+            feeder.start()
+            self._workers.append(feeder)
+            for i in range(self.worker_count):
+                worker = threading.Thread(
+                    target=self._work, name=f"sr-worker-{i}", daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+    def submit(self, job: Job) -> None:
+        self.start()
+        self.jobs[job.id] = job
+        try:
+            self._queue.put(job, block=False)
+        except queue.Full:
+            self.jobs.pop(job.id, None)
+            raise QueueFullError(f"Queue is full ({self.max_depth} jobs waiting).")
+
+    def is_full(self) -> bool:
+        return self._queue.full()
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job. Returns False if the job is unknown or already done.
+
+        A queued job is cancelled right away and leaves the queue, so it no
+        longer counts toward depth() and is_full(). A running or paused one
+        stops at its next tile boundary.
+        """
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.state not in LIVE_STATES:
+                return False
+            job.cancel_event.set()
+            if job.state == "queued":
+                job.set_state("cancel")
+                # not in either heap while the feeder moves it, _process drops it then
+                if self._queue.remove(job) or self._ready.remove(job):
+                    if job.decoded is not None:
+                        job.decoded.cancel()
+                        job.decoded = None
+                    self.jobs.pop(job.id, None)
+            return True
+
+    def depth(self) -> int:
+        return self._queue.qsize() + self._ready.qsize()
+
+    def _decode(self, job: Job) -> None:
+        from .process import load_image
+
+        if job.still_image and not job.cancel_event.is_set():
+            job.decoded = self._decoder.submit(load_image, job.input_path)
+
+    def _feed(self) -> None:
+        while True:
+            # waits while every worker is busy, which bounds the decoded inputs. The
+            # next job stays in _queue until then, where _checkpoint can still see it
+            self._ready.wait_for_room()
+            job = self._queue.get()
+            self._decode(job)
+            # the feeder is the only producer of _ready, the room is still there
+            self._ready.put(job)
+
+    def _work(self) -> None:
+        while True:
+            self._process(self._ready.get())
+
+    def _process(self, job: Job) -> None:
+        try:
+            with self._lock:
+                if job.cancel_event.is_set():
+                    job.decoded = None
+                    return
+                job.set_state("processing")
+            self._run(job)
+        finally:
+            self.jobs.pop(job.id, None)
+
+    def _checkpoint(self, job: Job) -> None:
+        """Tile boundary of a running job: stop it when cancelled, run outranking queued jobs first"""
+        if job.cancel_event.is_set():
+            raise JobCancelled(job.id)
+        if not jobPreemption:
+            return
+        rank = PRIORITY_RANK[job.priority]
+        paused = False
+        # jobs the feeder has not moved on yet are decoded here
+        while (other := self._ready.get_before(rank) or self._queue.get_before(rank)) is not None:
+            if not paused:
+                paused = True
+                job.set_state("paused")
+            if other.decoded is None:
+                self._decode(other)
+            self._process(other)
+        if paused:
+            if job.cancel_event.is_set():
+                raise JobCancelled(job.id)
+            job.set_state("processing")
+            state_manager.set_process_state("processing")
+
+    def _run(self, job: Job) -> None:
+        from .batch import process_batch
+        from .process import process_animation, upscale_image
+        from .variants import select_variant
+
+        try:
+            state_manager.set_process_state("processing")
+            variant = select_variant(job.model)
+            checkpoint = lambda: self._checkpoint(job)
+            sr_instance = create_sr_instance(variant, job.progress, checkpoint)
+            job.meta["variant"] = variant.variant
+            print(f"Using providers: {sr_instance.sess.get_providers()}")
+
+            # skip alpha sr
+            if job.skip_alpha:
+                sr_instance.alpha_upsampler = "interpolation"
+
+            create_instance = lambda model: create_sr_instance(select_variant(model), job.progress, checkpoint)
+            if job.decoded is not None:
+                img = job.decoded.result()
+                job.decoded = None
+                img_out, stats = upscale_image(
+                    sr_instance,
+                    img,
+                    job.output_path.parent,
+                    tileSize,
+                    job.scale,
+                    job.model,
+                    progress=job.progress,
+                    create_instance=create_instance,
+                )
+                del img
+                # the worker goes on with the next job while this one is written
+                self._encode_slots.acquire()
+                self._encoder.submit(self._save, job, img_out, stats)
+                return
+            if job.batch:
+                stats = process_batch(
+                    sr_instance,
+                    job.input_path,
+                    job.output_path,
+                    tileSize,
+                    job.scale,
+                    job.model,
+                    progress=job.progress,
+                    create_instance=create_instance,
+                    on_update=lambda stats: job.set_state("processing", **stats),
+                )
+            else:
+                stats = process_animation(
+                    sr_instance,
+                    job.input_path,
+                    job.output_path,
+                    tileSize,
+                    job.scale,
+                    job.model,
+                    progress=job.progress,
+                    create_instance=create_instance,
+                )
+            self._finish(job, stats)
+        except JobCancelled:
+            self._cancelled(job)
+        except Exception as e:
+            self._fail(job, e)
+
+    def _save(self, job: Job, img_out, stats: dict) -> None:
+        from .process import save_image
+
+        try:
+            save_image(img_out, job.output_path)
+            self._finish(job, stats)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            self._encode_slots.release()
+
+    def _finish(self, job: Job, stats: dict) -> None:
+        if job.cache_key:
+            result_cache.store(job.cache_key, job.output_path)
+        job.set_state("finished", outputUrl=output_url(job.output_path), **stats)
+        state_manager.set_process_state("finished")
+
+    def _cancelled(self, job: Job) -> None:
+        # a partly written animation or zip
+        job.output_path.unlink(missing_ok=True)
+        job.set_state("cancel")
+        state_manager.set_process_state("cancel")
+
+    def _fail(self, job: Job, e: Exception) -> None:
+        state_manager.show_error(traceback.format_exc())
+        state_manager.set_process_state("error")
+        job.set_state("error", error=str(e))
+
+
+job_queue = JobQueue(workerCount, maxQueueDepth)
@@ -1,24 +1,231 @@
+"""Registry of the models under ``models/<algo>/x<scale>/``.
+
+Files are indexed by (algo, name), ``<name>.<variant>.onnx`` files are the
+reduced precision variants of ``<name>.onnx`` (core.variants). The inputs,
+outputs and batch capability of a file are read from its ONNX graph without
+creating a session, on first use, and cached by file mtime in
+``profiles/models.json``.
+
+``rescan`` picks up added, changed and removed files (POST /models/rescan,
+and every ``modelRescanInterval`` seconds once ``watch`` is started). A scan
+builds a new index and swaps it in with one assignment, lookups never wait
+for it.
+"""
+
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from config import base_path, maxOutputPixels, modelMaxOutputPixels, modelRescanInterval
 from schemas import ModelInfo
-from config import base_path
+from .session_cache import session_cache
+from .tuning import profile_root
+from .utils import write_meta
+
 
+logger = logging.getLogger(__name__)
+
+# suffixes of the reduced precision copies made by core.variants
+VARIANTS = ("fp16", "int8")
 
-# Scan models
-model_list: list[ModelInfo] = []
 model_root = base_path / "models"
 
-for algo_dir in model_root.iterdir():
-    if not algo_dir.is_dir():
-        continue
-    algo = algo_dir.name
-    for scale_dir in algo_dir.iterdir():
-        if scale_dir.is_dir():
+
+@dataclass(frozen=True, slots=True)
+class ModelIndex:
+    models: list[ModelInfo] = field(default_factory=list)
+    variants: list[ModelInfo] = field(default_factory=list)
+    # (algo, name) -> fp32 models with that name, one per scale
+    by_name: dict[tuple[str, str], list[ModelInfo]] = field(default_factory=dict)
+    # (algo, scale, name) -> reduced precision variants
+    by_model: dict[tuple[str, int, str], list[ModelInfo]] = field(default_factory=dict)
+    # path -> (mtime_ns, size)
+    files: dict[str, tuple[int, int]] = field(default_factory=dict)
+
+
+def scan_models(root: Path) -> ModelIndex:
+    """Index of the .onnx files of root, only stats the files"""
+    index = ModelIndex()
+    if not root.is_dir():
+        return index
+    for model_file in sorted(root.glob("*/*/*.onnx")):
+        scale_dir = model_file.parent
+        algo = scale_dir.parent.name
+        try:
             scale = int(scale_dir.name.replace("x", ""))
-            for model_file in scale_dir.glob("*.onnx"):
-                model_list.append(
-                    ModelInfo(
-                        name=str(model_file.stem),
-                        path=str(model_file),
-                        scale=scale,
-                        algo=algo,
-                    )
-                )
+        except ValueError:
+            continue
+        stat = model_file.stat()
+        index.files[str(model_file)] = (stat.st_mtime_ns, stat.st_size)
+        name, _, variant = model_file.stem.rpartition(".")
+        if variant in VARIANTS:
+            info = ModelInfo(name=name, path=str(model_file), scale=scale, algo=algo, variant=variant)
+            index.variants.append(info)
+            index.by_model.setdefault((algo, scale, name), []).append(info)
+            continue
+        info = ModelInfo(name=str(model_file.stem), path=str(model_file), scale=scale, algo=algo)
+        index.models.append(info)
+        index.by_name.setdefault((algo, info.name), []).append(info)
+    return index
+
+
+def probe_model(path: str) -> dict:
+    """Inputs, outputs and batch capability of an ONNX file, read from its graph"""
+    import onnx
+
+    model = onnx.load(path, load_external_data=False)
+    graph = model.graph
+    initializers = {i.name for i in graph.initializer}
+
+    def describe(value) -> dict:
+        tensor = value.type.tensor_type
+        shape = [d.dim_value if d.HasField("dim_value") else (d.dim_param or None) for d in tensor.shape.dim]
+        return {
+            "name": value.name,
+            "dtype": onnx.helper.tensor_dtype_to_np_dtype(tensor.elem_type).name,
+            "shape": shape,
+        }
+
+    # older exports list the weights as graph inputs too
+    inputs = [describe(v) for v in graph.input if v.name not in initializers]
+    outputs = [describe(v) for v in graph.output]
+    input_shape = inputs[0]["shape"] if inputs else []
+    return {
+        "inputs": inputs,
+        "outputs": outputs,
+        # same rule as OnnxSRInfer: a symbolic or missing batch dim accepts (N,3,H,W)
+        "dynamic_batch": not (input_shape and isinstance(input_shape[0], int)),
+        "dynamic_axes": [i for i, d in enumerate(input_shape) if not isinstance(d, int)],
+        "opset": max((o.version for o in model.opset_import if o.domain in ("", "ai.onnx")), default=None),
+    }
+
+
+class ModelRegistry:
+    def __init__(self, root: Path, probe_path: Path) -> None:
+        self.root = root
+        self.probe_path = probe_path
+        self._index = scan_models(root)
+        self._scan_lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        # path -> {"mtime_ns", "size", "probe"}, loaded from probe_path on first use
+        self._probes: dict[str, dict] | None = None
+        self._watcher: threading.Thread | None = None
+        self._stop_watch = threading.Event()
+
+    @property
+    def models(self) -> list[ModelInfo]:
+        return self._index.models
+
+    @property
+    def variants(self) -> list[ModelInfo]:
+        return self._index.variants
+
+    def get(self, algo: str, name: str, scale: int | None = None) -> ModelInfo | None:
+        """The model algo:name, the one of the given scale if there are several"""
+        candidates = self._index.by_name.get((algo, name))
+        if not candidates:
+            return None
+        return next((m for m in candidates if m.scale == scale), candidates[0])
+
+    def variants_of(self, model: ModelInfo) -> list[ModelInfo]:
+        return [model] + self._index.by_model.get((model.algo, model.scale, model.name), [])
+
+    def version(self, model: ModelInfo) -> int | None:
+        """mtime_ns of the model file, changes when the file is replaced"""
+        entry = self._index.files.get(model.path)
+        return entry[0] if entry else None
+
+    def probe(self, model: ModelInfo) -> dict:
+        """probe_model of the file, cached until it changes. Errors are cached as {"error": ...}"""
+        stamp = self._index.files.get(model.path)
+        with self._probe_lock:
+            if self._probes is None:
+                self._probes = self._load_probes()
+            cached = self._probes.get(model.path)
+            if stamp is not None and cached is not None and (cached["mtime_ns"], cached["size"]) == tuple(stamp):
+                return cached["probe"]
+            try:
+                probe = probe_model(model.path)
+            except Exception as e:
+                probe = {"error": str(e)}
+            if stamp is not None:
+                self._probes[model.path] = {"mtime_ns": stamp[0], "size": stamp[1], "probe": probe}
+                self._save_probes()
+            return probe
+
+    def _load_probes(self) -> dict[str, dict]:
+        try:
+            with open(self.probe_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_probes(self) -> None:
+        # only files that still exist
+        probes = {path: p for path, p in self._probes.items() if path in self._index.files}
+        self.probe_path.parent.mkdir(parents=True, exist_ok=True)
+        write_meta(self.probe_path, probes)
+
+    def rescan(self) -> dict:
+        """Rescan root and swap in the new index, returns the added, changed and removed files"""
+        with self._scan_lock:
+            old = self._index.files
+            index = scan_models(self.root)
+            added = [p for p in index.files if p not in old]
+            removed = [p for p in old if p not in index.files]
+            changed = [p for p in index.files if p in old and index.files[p] != old[p]]
+            self._index = index
+        # warm sessions of a replaced file would keep running the old weights
+        for path in removed + changed:
+            session_cache.discard(path)
+        if added or removed or changed:
+            logger.info("models rescanned: %d added, %d changed, %d removed", len(added), len(changed), len(removed))
+        return {
+            "added": [self._relative(p) for p in added],
+            "changed": [self._relative(p) for p in changed],
+            "removed": [self._relative(p) for p in removed],
+            "models": len(index.models),
+            "variants": len(index.variants),
+        }
+
+    def _relative(self, path: str) -> str:
+        return Path(path).relative_to(self.root).as_posix()
+
+    def watch(self, interval: float | None = modelRescanInterval) -> None:
+        """Rescan every interval seconds on a daemon thread, nothing when interval is None"""
+        if interval is None or self._watcher is not None:
+            return
+
+        def loop() -> None:
+            while not self._stop_watch.wait(interval):
+                try:
+                    self.rescan()
+                except Exception:
+                    logger.exception("model rescan failed")
+
+        self._watcher = threading.Thread(target=loop, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watch(self) -> None:
+        """Stop the rescan thread of watch(), a rescan in progress is finished first"""
+        if self._watcher is None:
+            return
+        self._stop_watch.set()
+        self._watcher.join()
+        self._watcher = None
+        self._stop_watch.clear()
+
+
+model_registry = ModelRegistry(model_root, profile_root / "models.json")
+
+
+def variants_of(model: ModelInfo) -> list[ModelInfo]:
+    """The model itself followed by its reduced precision variants"""
+    return model_registry.variants_of(model)
+
+
+def max_output_pixels(model: ModelInfo) -> int:
+    """Output pixels one image may have with this model"""
+    return modelMaxOutputPixels.get(f"{model.algo}:{model.name}", maxOutputPixels)
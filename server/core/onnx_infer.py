@@ -2,13 +2,17 @@ import onnxruntime as ort
 import cv2
 import numpy as np
 import math
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 
 class OnnxSRInfer:
 
     def __init__(self, model_path,scale,name,
                  alpha_upsampler='sr model',providers=['DmlExecutionProvider'],provider_options=None,
-                 progress_setter=None):
+                 progress_setter=None,batch_size=1,session_cache=None,flat_tile_variance=None,
+                 tile_workers=1,intra_op_threads=None,io_binding=False,checkpoint=None):
         """Onnx SR Infer
 
         Args:
@@ -19,8 +23,31 @@ class OnnxSRInfer:
             providers (list, optional): Ort providers. Defaults to ['DmlExecutionProvider'].
             provider_options (list, optional): eg. [{'device_id': 0}]
             progress_setter: The function called when completing a block.(Used to communicate progress information)
+                Called as progress_setter(progress, time, total_img_num, processed_img_num, tiles_done=, tiles_total=).
+            batch_size (int, optional): Number of tiles sent to the session in one call. Defaults to 1.
+                Models exported with a fixed batch dimension always run one tile at a time.
+            session_cache (optional): Registry with a get(model_path, providers, provider_options, intra_op_threads) method.
+                When given, a warm session is reused instead of creating a new one.
+            flat_tile_variance (float, optional): Tiles whose per channel variance (0-255 scale, padding included)
+                is at most this are resized instead of sent to the model. Defaults to None (disabled).
+            tile_workers (int, optional): Number of tile batches run concurrently on the session. Defaults to 1.
+            intra_op_threads (int, optional): onnxruntime intra-op thread count. Defaults to None (ort default).
+            io_binding (bool, optional): Run through an IOBinding with OrtValues preallocated per tile shape
+                instead of sess.run. On CUDA/TensorRT the input lives on the device. Defaults to False.
+            checkpoint (callable, optional): Called without arguments before every tile batch is sent to the session.
+                It may block (the job is paused, the tiles written so far stay in the canvas) or raise to stop tile_process.
         """
-        self.sess = ort.InferenceSession(model_path,providers=providers,provider_options=provider_options)
+        if session_cache is not None:
+            self.sess = session_cache.get(model_path,providers,provider_options,intra_op_threads)
+        else:
+            sess_options = ort.SessionOptions()
+            if intra_op_threads:
+                sess_options.intra_op_num_threads = intra_op_threads
+            self.sess = ort.InferenceSession(model_path,sess_options=sess_options,providers=providers,
+                                             provider_options=provider_options)
+        # a symbolic or missing batch dim means the model accepts (N,3,H,W)
+        self.dynamic_batch = not isinstance(self.sess.get_inputs()[0].shape[0], int)
+        self.batch_size = batch_size
         self.name = name
         self.scale = scale
         self.alpha_upsampler = alpha_upsampler
@@ -28,79 +55,114 @@ class OnnxSRInfer:
         self.model_path = model_path
         self.total_img_num = 1
         self.processed_img_num = 0
+        self.tile_workers = tile_workers
+        # per thread (batch, height, width) -> preallocated session input
+        self.local = threading.local()
+        self.flat_tile_variance = flat_tile_variance
+        self.io_binding = io_binding
+        self.checkpoint = checkpoint
+        self.executor = None
+        self.device, self.device_id = self.binding_device() if io_binding else ('cpu', 0)
+        self.skipped_tiles = 0
+        self.reused_tiles = 0
+        self.inferred_tiles = 0
+        self.infer_seconds = 0.0
 
-    def img_array_norm_expd(self,img):
-        img = np.array(img).astype(np.float32) / 255.0
-        img = np.transpose(img, (2, 0, 1))
-        img = np.expand_dims(img, axis=0)
-        return img
-    def img_array_denorm_squeeze(self,img):
-        output_image = np.squeeze(img)
-        output_image = np.transpose(output_image, (1, 2, 0))
-        output_image = (output_image * 255.0).clip(0, 255).astype(np.uint8)
-        output_image = cv2.cvtColor(output_image, cv2.COLOR_RGB2BGR)
-        return output_image
-    
-    def mod_pad(self, img, mod=16):
-        """
-        Pad image with reflect padding along the height and width axes, based on the modulus value.
-        
-        Args:
-        img (np.array): The input image.
-        mod (int): The modulus value to be used for padding. Default is 16.
-        
-        Returns:
-        padded_img (np.array): The padded image.
-        pad_height (int): The added padding height.
-        pad_width (int): The added padding width.
-        """
-        mod_pad_h, mod_pad_w = 0, 0
-        h, w, c = img.shape
-        if (h % mod != 0):
-            mod_pad_h = (mod - h % mod)
-        if (w % mod != 0):
-            mod_pad_w = (mod - w % mod)
-        pad_img = np.pad(img, ((0, mod_pad_h), (0, mod_pad_w), (0, 0)), 'reflect')
-        return pad_img, mod_pad_h, mod_pad_w
-
-    def remove_mod_pad(self, img, pad_height, pad_width):
-        h,w,c = img.shape
-        return img[0:h-self.scale*pad_height, 0:w-self.scale*pad_width,:]
-    
-    def infer(self, img):
+    def input_buffer(self, batch, height, width):
+        """Contiguous float32 (batch,3,height,width) session input, allocated once per tile shape and thread"""
+        buffers = self.local.__dict__.setdefault('input_buffers', {})
+        key = (batch, height, width)
+        buffer = buffers.get(key)
+        if buffer is None:
+            buffer = buffers[key] = np.empty((batch, 3, height, width), dtype=np.float32)
+        return buffer
+
+    def binding_device(self):
+        """(ort device name, device id) the IOBinding input is allocated on"""
+        provider = self.sess.get_providers()[0]
+        if provider in ('CUDAExecutionProvider', 'TensorrtExecutionProvider'):
+            options = self.sess.get_provider_options().get(provider, {})
+            return 'cuda', int(options.get('device_id', 0))
+        return 'cpu', 0
+
+    def binding(self, batch):
         """
-        infer image
+        IOBinding of a session input buffer, created once per tile shape and thread.
+        The output is bound to a preallocated host array, on CUDA the input is copied
+        into a device OrtValue before every run.
+        return: (binding, device input OrtValue or None, host output np.array)
+        """
+        bindings = self.local.__dict__.setdefault('bindings', {})
+        key = batch.shape
+        entry = bindings.get(key)
+        if entry is None:
+            n, c, h, w = batch.shape
+            output = np.empty((n, c, h * self.scale, w * self.scale), dtype=np.float32)
+            binding = self.sess.io_binding()
+            device_input = None
+            if self.device == 'cpu':
+                # shares the memory of the host buffer, nothing is copied
+                binding.bind_ortvalue_input('input', ort.OrtValue.ortvalue_from_numpy(batch))
+            else:
+                device_input = ort.OrtValue.ortvalue_from_shape_and_type(batch.shape, np.float32,
+                                                                         self.device, self.device_id)
+                binding.bind_ortvalue_input('input', device_input)
+            binding.bind_ortvalue_output('output', ort.OrtValue.ortvalue_from_numpy(output))
+            entry = bindings[key] = (binding, device_input, output)
+        return entry
+
+    def run_session(self, batch):
+        """session output for the (n,3,h,w) float32 input, through sess.run or the IOBinding"""
+        if not self.io_binding:
+            return self.sess.run(['output'], {'input': batch})[0]
+        binding, device_input, output = self.binding(batch)
+        if device_input is not None:
+            device_input.update_inplace(batch)
+        self.sess.run_with_iobinding(binding)
+        return output
+
+    def infer_tiles(self, imgs, height, width):
+        """
+        infer tiles in one session call
         Args:
-            img (np.array)(h,w,c)
-        return: img (np.array)(h,w,c)
+            imgs (list[np.array])(h,w,c): BGR uint8 tiles no larger than (height,width),
+                smaller tiles are reflect padded at the bottom/right
+            height (int), width (int): tile shape sent to the session
+        return: np.array(n,c,height*scale,width*scale): RGB float32 in [0,255].
+            Callers flip channels and cast to uint8 while copying into their canvas.
+            With io_binding it is a per thread buffer, overwritten by the next call.
         """
-        img = self.img_array_norm_expd(img)
-        img_sr = self.sess.run(['output'], {'input': img})[0]
-        output = self.img_array_denorm_squeeze(img_sr)
+        batch = self.input_buffer(len(imgs), height, width)
+        for i, img in enumerate(imgs):
+            if img.shape[0] != height or img.shape[1] != width:
+                img = np.pad(img, ((0, height - img.shape[0]), (0, width - img.shape[1]), (0, 0)), 'reflect')
+            # BGR->RGB and HWC->CHW are views, normalization writes straight into the buffer
+            np.divide(img[:, :, ::-1].transpose(2, 0, 1), np.float32(255.0), out=batch[i])
+        output = self.run_session(batch)
+        np.multiply(output, np.float32(255.0), out=output)
+        np.clip(output, 0, 255, out=output)
         return output
 
-    def tile_process(self, img, tile_size,tile_pad=16):
+    def infer(self, img):
         """
-        It will first crop input images to tiles, and then process each tile.
-        Finally, all the processed tiles are merged into one images.
+        infer image
         Args:
-            img (np.array)(h,w,c): image to be processed.
-            tile_size (int): tile size.
-            tile_pad (int):tile pad size.
-        return: img (np.array)(h,w,c): processed image.
-        Modified from: https://github.com/ata4/esrgan-launcher
+            img (np.array)(h,w,c): BGR uint8
+        return: img (np.array)(h,w,c): BGR uint8
         """
-        height, width, channle = img.shape
-        output_height = height * self.scale
-        output_width = width * self.scale
-        output_shape = ( output_height, output_width, channle)
+        height, width, _ = img.shape
+        img_sr = self.infer_tiles([img], height, width)[0]
+        return img_sr[::-1].transpose(1, 2, 0).astype(np.uint8)
 
-        # start with black image
-        output = np.zeros(output_shape, dtype=np.float32)
+    def tile_boxes(self, height, width, tile_size, tile_pad):
+        """
+        Split an image into tiles.
+        return: list of (input area with padding, output area on total image, output area inside the tile),
+            each as (start_y, end_y, start_x, end_x)
+        """
         tiles_x = math.ceil(width / tile_size)
         tiles_y = math.ceil(height / tile_size)
-
-        # loop over all tiles
+        boxes = []
         for y in range(tiles_y):
             for x in range(tiles_x):
                 # extract tile from input image
@@ -121,11 +183,7 @@ class OnnxSRInfer:
                 # input tile dimensions
                 input_tile_width = input_end_x - input_start_x
                 input_tile_height = input_end_y - input_start_y
-                tile_idx = y * tiles_x + x + 1
-                input_tile = img[input_start_y_pad:input_end_y_pad, input_start_x_pad:input_end_x_pad,:]
 
-                # upscale tile
-                output_tile = self.infer(input_tile)
                 # output tile area on total image
                 output_start_x = input_start_x * self.scale
                 output_end_x = input_end_x * self.scale
@@ -138,44 +196,243 @@ class OnnxSRInfer:
                 output_start_y_tile = (input_start_y - input_start_y_pad) * self.scale
                 output_end_y_tile = output_start_y_tile + input_tile_height * self.scale
 
-                # put tile into output image
-                output[output_start_y:output_end_y,output_start_x:output_end_x,:] \
-                    = output_tile[output_start_y_tile:output_end_y_tile,output_start_x_tile:output_end_x_tile,:]
-                self.progress_setter(tile_idx/tiles_x/tiles_y,time.time(),self.total_img_num,self.processed_img_num)
+                boxes.append((
+                    (input_start_y_pad, input_end_y_pad, input_start_x_pad, input_end_x_pad),
+                    (output_start_y, output_end_y, output_start_x, output_end_x),
+                    (output_start_y_tile, output_end_y_tile, output_start_x_tile, output_end_x_tile),
+                ))
+        return boxes
+
+    def is_flat(self, img):
+        """Whether the largest per channel variance of a tile is within flat_tile_variance"""
+        return img.var(axis=(0, 1)).max() <= self.flat_tile_variance
+
+    def write_tile(self, canvas, out_box, tile_box, output_tile):
+        """
+        Copy the unpadded area of an upscaled tile into the canvas.
+        output_tile is (h,w,3) BGR or (h,w) gray, a 1 channel canvas gets the gray value.
+        """
+        out_y0, out_y1, out_x0, out_x1 = out_box
+        tile_y0, tile_y1, tile_x0, tile_x1 = tile_box
+        if out_y1 <= out_y0 or out_x1 <= out_x0:
+            return
+        output_tile = output_tile[tile_y0:tile_y1, tile_x0:tile_x1]
+        if output_tile.ndim == 2:
+            output_tile = output_tile[:, :, np.newaxis]
+        elif canvas.shape[2] == 1:
+            output_tile = cv2.cvtColor(output_tile.astype(np.uint8), cv2.COLOR_BGR2GRAY)[:, :, np.newaxis]
+        # the assignment does the uint8 cast
+        canvas[out_y0:out_y1, out_x0:out_x1, :] = output_tile
+
+    def infer_batch(self, batch, batch_height, batch_width, mod=16):
+        """
+        Upscale a batch of tiles in one session call and write them into their canvases.
+        Args:
+            batch (list): (BGR input tile, canvas, output area on total image, output area inside the tile)
+            batch_height (int), batch_width (int): uniform shape used when the batch has more than one tile
+            mod (int): a single tile is reflect padded up to a multiple of mod
+        return: seconds spent in the model
+        """
+        input_tiles = [input_tile for input_tile, _, _, _ in batch]
+        if len(input_tiles) == 1:
+            tile_height, tile_width, _ = input_tiles[0].shape
+            tile_height = -(-tile_height // mod) * mod
+            tile_width = -(-tile_width // mod) * mod
+        else:
+            tile_height, tile_width = batch_height, batch_width
+        start = time.perf_counter()
+        output_tiles = self.infer_tiles(input_tiles, tile_height, tile_width)
+        elapsed = time.perf_counter() - start
+        for i, (_, canvas, out_box, tile_box) in enumerate(batch):
+            # RGB CHW -> BGR HWC view
+            self.write_tile(canvas, out_box, tile_box, output_tiles[i, ::-1].transpose(1, 2, 0))
+        return elapsed
+
+    def tile_executor(self):
+        """
+        Thread pool of the tile workers, None with a single worker. Created on first use and kept
+        for the following images, passes and frames, so the per thread input buffers and IOBindings
+        are reused. Its threads exit once the instance is garbage collected.
+        """
+        if self.tile_workers <= 1:
+            return None
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.tile_workers, thread_name_prefix='sr-tile')
+        return self.executor
+
+    @property
+    def saved_seconds(self):
+        """Estimated model time saved by skipping flat tiles"""
+        if not self.inferred_tiles:
+            return 0.0
+        return self.skipped_tiles * self.infer_seconds / self.inferred_tiles
+
+    def tile_process(self, img, tile_size,tile_pad=16,output=None,mod=16,previous=None):
+        """
+        It will first crop input images to tiles, and then process each tile.
+        Finally, all the processed tiles are merged into one images.
+        When batch_size > 1 and the model has a dynamic batch dim, tiles are padded
+        to a uniform shape and sent to the session batch_size at a time.
+        For BGRA images the alpha tiles go through the same session calls as the color
+        tiles (as 3 channel gray), and alpha tiles with a constant value skip the model.
+        With flat_tile_variance set, near uniform tiles are upscaled with a bicubic resize instead.
+        With tile_workers > 1, batches run concurrently on the session; every tile writes its own
+        canvas area, so the result is the same as the sequential path.
+        With previous set (animation frames), tiles whose padded input equals the previous
+        frame copy its output instead.
+        The checkpoint runs before every batch, so a job is paused or cancelled at a tile boundary.
+        Args:
+            img (np.array)(h,w,c): BGR/BGRA uint8 image to be processed.
+            tile_size (int): tile size.
+            tile_pad (int):tile pad size.
+            output (np.array, optional)(h,w,c): canvas the tiles are written into, e.g. a uint8 np.memmap.
+                It may be smaller than the scaled image (tiles are clipped).
+            mod (int): tiles are reflect padded to a multiple of mod before inference,
+                so the image itself needs no padded copy.
+            previous (tuple, optional): (img, output) of the previous frame, same shapes as img and output.
+        return: img (np.array)(h,w,c): processed BGR/BGRA uint8 image.
+        Modified from: https://github.com/ata4/esrgan-launcher
+        """
+        height, width, channle = img.shape
+        output_height = height * self.scale
+        output_width = width * self.scale
+        output_shape = ( output_height, output_width, channle)
+
+        if output is None:
+            # start with black image
+            output = np.zeros(output_shape, dtype=np.uint8)
+        canvas_height, canvas_width, _ = output.shape
+        color_output = output[:, :, 0:3]
+        alpha_output = output[:, :, 3:4] if channle == 4 else None
+        previous_img, previous_output = previous if previous is not None else (None, None)
+
+        def unchanged(input_tile, in_y0, in_y1, in_x0, in_x1, channels, previous_canvas):
+            # the previous output of an identical input tile, or None
+            if previous_img is None:
+                return None
+            if not np.array_equal(input_tile, previous_img[in_y0:in_y1, in_x0:in_x1, channels]):
+                return None
+            return previous_canvas
+
+        # (input tile, canvas, output area on total image, output area inside the tile, previous canvas to copy)
+        tiles = []
+        for (in_y0, in_y1, in_x0, in_x1), out_box, tile_box in self.tile_boxes(height, width, tile_size, tile_pad):
+            # clip to the canvas
+            out_y0, out_y1, out_x0, out_x1 = out_box
+            tile_y0, tile_y1, tile_x0, tile_x1 = tile_box
+            tile_y1 -= max(out_y1 - canvas_height, 0)
+            tile_x1 -= max(out_x1 - canvas_width, 0)
+            out_box = (out_y0, min(out_y1, canvas_height), out_x0, min(out_x1, canvas_width))
+            tile_box = (tile_y0, tile_y1, tile_x0, tile_x1)
+            color_tile = img[in_y0:in_y1, in_x0:in_x1, 0:3]
+            tiles.append((color_tile, color_output, out_box, tile_box,
+                          unchanged(color_tile, in_y0, in_y1, in_x0, in_x1, slice(0, 3),
+                                    previous_output[:, :, 0:3] if previous_output is not None else None)))
+            if alpha_output is not None:
+                alpha_tile = img[in_y0:in_y1, in_x0:in_x1, 3]
+                tiles.append((alpha_tile, alpha_output, out_box, tile_box,
+                              unchanged(alpha_tile, in_y0, in_y1, in_x0, in_x1, 3,
+                                        previous_output[:, :, 3:4] if previous_output is not None else None)))
+
+        total_tiles = len(tiles)
+        tile_idx = 0
+        batch_size = max(self.batch_size, 1) if self.dynamic_batch else 1
+        # every tile fits in this shape
+        batch_height = -(-min(tile_size + 2 * tile_pad, height) // mod) * mod
+        batch_width = -(-min(tile_size + 2 * tile_pad, width) // mod) * mod
+
+        def tiles_done(count):
+            nonlocal tile_idx
+            tile_idx += count
+            if self.progress_setter:
+                self.progress_setter(tile_idx/total_tiles,time.time(),self.total_img_num,self.processed_img_num,
+                                     tiles_done=tile_idx,tiles_total=total_tiles)
+
+        # batches submitted to the tile workers, finished in submission order
+        running = deque()
+
+        def batch_done(count, elapsed):
+            self.infer_seconds += elapsed
+            self.inferred_tiles += count
+            tiles_done(count)
+
+        def finish_running(limit):
+            while len(running) > limit:
+                count, future = running.popleft()
+                batch_done(count, future.result())
+
+        executor = self.tile_executor()
+        try:
+
+            def run_batch(batch):
+                if self.checkpoint:
+                    self.checkpoint()
+                if executor is None:
+                    batch_done(len(batch), self.infer_batch(batch, batch_height, batch_width, mod))
+                else:
+                    running.append((len(batch), executor.submit(self.infer_batch, batch, batch_height, batch_width, mod)))
+                    # bound the tiles held in memory
+                    finish_running(2 * self.tile_workers)
+
+            batch = []
+            for input_tile, canvas, out_box, tile_box, previous_canvas in tiles:
+                if previous_canvas is not None:
+                    out_y0, out_y1, out_x0, out_x1 = out_box
+                    canvas[out_y0:out_y1, out_x0:out_x1] = previous_canvas[out_y0:out_y1, out_x0:out_x1]
+                    self.reused_tiles += 1
+                    tiles_done(1)
+                    continue
+                if input_tile.ndim == 2 and input_tile.min() == input_tile.max():
+                    # fully opaque/transparent (or any constant) alpha needs no model
+                    out_y0, out_y1, out_x0, out_x1 = out_box
+                    canvas[out_y0:out_y1, out_x0:out_x1, :] = input_tile[0, 0]
+                    tiles_done(1)
+                    continue
+                if self.flat_tile_variance is not None and self.is_flat(input_tile):
+                    # near uniform tile, a resize looks the same as the model output
+                    tile_height, tile_width = input_tile.shape[:2]
+                    output_tile = cv2.resize(input_tile, (tile_width * self.scale, tile_height * self.scale),
+                                             interpolation=cv2.INTER_CUBIC)
+                    self.write_tile(canvas, out_box, tile_box, output_tile)
+                    self.skipped_tiles += 1
+                    tiles_done(1)
+                    continue
+                if input_tile.ndim == 2:
+                    input_tile = cv2.cvtColor(input_tile, cv2.COLOR_GRAY2BGR)
+                batch.append((input_tile, canvas, out_box, tile_box))
+                if len(batch) == batch_size:
+                    run_batch(batch)
+                    batch = []
+            if batch:
+                run_batch(batch)
+            finish_running(0)
+        finally:
+            # a failed or cancelled run leaves no batch writing into the canvas
+            wait([future for _, future in running])
 
         return output
-    def rgb_process_pipeline(self, image, tile_size):
-        # mod pad
-        pad_img,pad_h,pad_w = self.mod_pad(image)
-        # tile process
-        sr_img = self.tile_process(pad_img,tile_size)
-        # remove pad
-        final_img = self.remove_mod_pad(sr_img,pad_h,pad_w)
-        return final_img
-    
-    def universal_process_pipeline(self, image,tile_size):
-        img_mode = 'RGB'
+    def universal_process_pipeline(self, image,tile_size,output=None,previous=None):
+        """
+        SR an BGR/BGRA image in one tile pass, the alpha channel shares the session calls of the color tiles.
+        Args:
+            image (np.array)(h,w,c): image to be processed.
+            tile_size (int): tile size.
+            output (np.array, optional)(h*scale,w*scale,c): uint8 canvas, e.g. a np.memmap.
+                Tiles are written straight into it without any full size intermediate.
+            previous (tuple, optional): (image, output) of the previous animation frame,
+                unchanged tiles copy its output instead of running the model.
+        return: img (np.array)(h*scale,w*scale,c)
+        """
         h,w,c = image.shape
         # handle RGBA image
-        if c == 4:
-            img_mode = 'RGBA'
-            alpha = image[:, :,3]
-            image = image[:, :,0:3]
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            if self.alpha_upsampler == 'sr model':
-                alpha = cv2.cvtColor(alpha, cv2.COLOR_GRAY2RGB)
-        else:
-            image = cv2.cvtColor(image,cv2.COLOR_BGR2RGB)
-        # process image (without alpha channel)
-        output_img = self.rgb_process_pipeline(image,tile_size)
-        # process alpha channel
-        if img_mode == 'RGBA':
-            if self.alpha_upsampler == 'sr model':
-                alpha_img = self.rgb_process_pipeline(alpha,tile_size)
-                output_alpha = cv2.cvtColor(alpha_img, cv2.COLOR_BGR2GRAY)
-            else:  # use the cv2 resize for alpha channel
-                output_alpha = cv2.resize(alpha, (w * self.scale, h * self.scale), interpolation=cv2.INTER_LINEAR)
-            # merge the alpha channel
-            output_img = cv2.cvtColor(output_img, cv2.COLOR_BGR2BGRA)
-            output_img[:, :, 3] = output_alpha
-        return output_img
+        interpolate_alpha = c == 4 and self.alpha_upsampler != 'sr model'
+        if output is None:
+            output = np.zeros((h * self.scale, w * self.scale, c), dtype=np.uint8)
+        # tiles are mod padded one by one, no padded copy of the image is made
+        if previous is not None and interpolate_alpha:
+            previous = (previous[0][:, :, 0:3], previous[1][:, :, 0:3])
+        self.tile_process(image[:, :, 0:3] if interpolate_alpha else image,tile_size,output=output[:, :, 0:3 if interpolate_alpha else c],
+                          previous=previous)
+        if interpolate_alpha:  # use the cv2 resize for alpha channel
+            output[:, :, 3] = cv2.resize(image[:, :, 3], (w * self.scale, h * self.scale), interpolation=cv2.INTER_LINEAR)
+        return output
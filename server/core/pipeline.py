@@ -0,0 +1,85 @@
+import queue
+import threading
+from collections.abc import Callable, Iterable
+from typing import Any
+
+
+_DONE = object()
+
+
+def run_pipeline(
+    items: Iterable,
+    decode: Callable[[Any], Any],
+    infer: Callable[[Any, Any], Any],
+    encode: Callable[[Any, Any], None],
+    depth: int = 2,
+) -> None:
+    """Run decode, infer and encode of consecutive items concurrently.
+
+    decode(item) runs on a reader thread, infer(item, decoded) on the calling
+    thread and encode(item, result) on a writer thread, with at most ``depth``
+    items waiting between two stages. An exception raised by decode or infer
+    is handed on in place of the value, so encode can record a per-item error;
+    an exception raised by encode stops the pipeline and is re-raised.
+    """
+    decoded: queue.Queue = queue.Queue(depth)
+    inferred: queue.Queue = queue.Queue(depth)
+    stop = threading.Event()
+    failure: list[BaseException] = []
+
+    def read() -> None:
+        try:
+            for item in items:
+                if stop.is_set():
+                    break
+                try:
+                    value = decode(item)
+                except Exception as e:
+                    value = e
+                decoded.put((item, value))
+        except BaseException as e:
+            failure.append(e)
+        finally:
+            decoded.put(_DONE)
+
+    def write() -> None:
+        while (entry := inferred.get()) is not _DONE:
+            if failure:
+                # keep draining so the infer stage never blocks
+                continue
+            try:
+                encode(*entry)
+            except BaseException as e:
+                failure.append(e)
+                stop.set()
+
+    reader = threading.Thread(target=read, name="pipeline-decode", daemon=True)
+    writer = threading.Thread(target=write, name="pipeline-encode", daemon=True)
+    reader.start()
+    writer.start()
+    try:
+        while (entry := decoded.get()) is not _DONE:
+            if failure:
+                continue
+            item, value = entry
+            if not isinstance(value, Exception):
+                try:
+                    value = infer(item, value)
+                except Exception as e:
+                    value = e
+            inferred.put((item, value))
+    except BaseException:
+        stop.set()
+        # unblock the reader, it stops at the next item
+        while reader.is_alive():
+            try:
+                decoded.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        raise
+    finally:
+        inferred.put(_DONE)
+        writer.join()
+        reader.join()
+    if failure:
+        raise failure[0]
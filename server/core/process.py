@@ -1,48 +1,25 @@
-import math
+import itertools
 from pathlib import Path
+from typing import Callable
 
 import numpy as np
 import cv2
 
 from schemas import ModelInfo
-from config import base_path
-from .global_state import state_manager
+from config import animationFrameTolerance, base_path, largeImagePixels
+from .animation import animation_info, open_writer, read_frames
+from .image_io import decode_image, encode_image, open_canvas
+from .models import model_registry
 from .onnx_infer import OnnxSRInfer
+from .progress import TaskProgress
+from .scale_plan import ScalePlan, plan_scale
+from .tuning import tuned_tile
+from .utils import PeakRss
 
 
-def process_image(
-    sr_instance: OnnxSRInfer,
-    inputImage: str | Path,
-    output_path: str | Path,
-    tileSize: int,
-    scale: int,
-    model: ModelInfo,
-    resizeTo: str | None = None,
-) -> None:
-    """sr process"""
-    img_in = base_path / inputImage
-
-    # for img_in in imgs_in:
-    img = cv2.imdecode(np.fromfile(img_in, dtype=np.uint8), cv2.IMREAD_UNCHANGED)
-    h, w, c = img.shape
-    sr_img = sr_instance.universal_process_pipeline(img, tile_size=tileSize)
-    target_h = None
-    target_w = None
-    # scale >model scale: re process
-    if scale > model.scale and model.scale != 1:
-        # calc process times
-        scale_log = math.log(scale, model.scale)
-        total_times = math.ceil(scale_log)
-        # calc target size
-        if total_times != int(scale_log):
-            target_h = h * scale
-            target_w = w * scale
-
-        for t in range(total_times - 1):
-            sr_img = sr_instance.universal_process_pipeline(sr_img, tile_size=tileSize)
-    elif scale < model.scale:
-        target_h = h * scale
-        target_w = w * scale
+def target_size(h: int, w: int, scale: int, resizeTo: str | None = None) -> tuple[int, int]:
+    target_h = h * scale
+    target_w = w * scale
     # size in parameters first
     if resizeTo:
         if "x" in resizeTo:
@@ -53,12 +30,220 @@ def process_image(
             ratio = int(resizeTo.split("/")[0]) / int(resizeTo.split("/")[1])
             target_w = int(w * ratio)
             target_h = int(h * ratio)
-    if target_w:
-        img_out = cv2.resize(sr_img, (target_w, target_h))  # type: ignore
-    else:
-        img_out = sr_img
-    # save
-    cv2.imencode(".png", img_out)[1].tofile(output_path)
+    return target_h, target_w
+
+
+class PlanRunner:
+    """Runs the passes of a ScalePlan on images of one size.
+
+    Instances for other models of the chain come from ``create_instance`` and
+    are kept for the following images (animation frames, batch files). Passes whose output
+    exceeds ``largeImagePixels`` write their tiles into a memory-mapped uint8
+    canvas instead of an in-memory image.
+    """
+
+    def __init__(
+        self,
+        plan: ScalePlan,
+        sr_instance: OnnxSRInfer,
+        tileSize: int,
+        canvas_folder: Path,
+        create_instance: Callable[[ModelInfo], OnnxSRInfer] | None = None,
+        instances: dict[str, OnnxSRInfer] | None = None,
+    ) -> None:
+        self.plan = plan
+        self.sr_instance = sr_instance
+        self.tileSize = tileSize
+        self.canvas_folder = canvas_folder
+        self.create_instance = create_instance
+        # model path -> instance, may be shared by the runners of a batch.
+        # sr_instance serves the requested model, whichever variant file it loaded
+        self.instances = instances if instances is not None else {}
+        self.instances.setdefault(plan.model.path, sr_instance)
+        self.tile_sizes: list[int] = []
+        self.large_image = False
+
+    def instance(self, model: ModelInfo) -> OnnxSRInfer:
+        instance = self.instances.get(model.path)
+        if instance is None:
+            instance = self.instances[model.path] = self.create_instance(model)  # type: ignore
+            instance.alpha_upsampler = self.sr_instance.alpha_upsampler
+        return instance
+
+    def run(self, img: np.ndarray, progress: TaskProgress | None = None, first_pass: int = 0,
+            pass_total: int | None = None, previous: list | None = None) -> tuple[np.ndarray, list]:
+        """Upscale img to the plan target.
+
+        previous is the second return value of the run on the previous frame,
+        unchanged tiles reuse its outputs. Returns (image, (input, output) of every pass).
+        """
+        passes = []
+        sr_img = img
+        for t, step in enumerate(self.plan.steps):
+            if progress:
+                progress.start_pass(first_pass + t + 1, pass_total or len(self.plan.steps))
+            instance = self.instance(step.model)
+            if step.resize_to:
+                sr_img = cv2.resize(sr_img, step.resize_to[::-1], interpolation=cv2.INTER_AREA)
+            pass_h, pass_w, pass_c = sr_img.shape
+            pass_tile = self.tileSize
+            tuned = tuned_tile(step.model, pass_h, pass_w)
+            if tuned:
+                pass_tile, instance.batch_size = tuned
+            if len(self.tile_sizes) <= t:
+                self.tile_sizes.append(pass_tile)
+            canvas = None
+            if pass_h * pass_w * instance.scale**2 > largeImagePixels:
+                self.large_image = True
+                canvas = open_canvas(
+                    (pass_h * instance.scale, pass_w * instance.scale, pass_c),
+                    self.canvas_folder,
+                )
+            pass_in = sr_img
+            sr_img = instance.universal_process_pipeline(
+                sr_img, tile_size=pass_tile, output=canvas, previous=previous[t] if previous else None
+            )
+            passes.append((pass_in, sr_img))
+        if self.plan.needs_resize:
+            target_h, target_w = self.plan.target_size
+            sr_img = cv2.resize(sr_img, (target_w, target_h))
+        return sr_img, passes
+
+    def stats(self) -> dict:
+        instances = self.instances.values()
+        return {
+            "tileSize": self.tile_sizes[0],
+            "passes": [
+                {"model": f"{s.model.algo}:{s.model.name}", "scale": s.model.scale, "input": list(s.input_size)}
+                for s in self.plan.steps
+            ],
+            "largeImage": self.large_image,
+            "skippedTiles": sum(i.skipped_tiles for i in instances),
+            "savedSeconds": round(sum(i.saved_seconds for i in instances), 3),
+        }
+
+
+def load_image(inputImage: str | Path) -> np.ndarray:
+    return decode_image(np.fromfile(base_path / inputImage, dtype=np.uint8))
+
+
+def save_image(img: np.ndarray, output_path: str | Path) -> None:
+    encode_image(img, Path(output_path).suffix).tofile(output_path)
+
+
+def upscale_image(
+    sr_instance: OnnxSRInfer,
+    img: np.ndarray,
+    canvas_folder: Path,
+    tileSize: int,
+    scale: int,
+    model: ModelInfo,
+    resizeTo: str | None = None,
+    progress: TaskProgress | None = None,
+    create_instance: Callable[[ModelInfo], OnnxSRInfer] | None = None,
+) -> tuple[np.ndarray, dict]:
+    """sr of a decoded image, returns (image, stats for the task meta)
+
+    The passes come from core.scale_plan: with ``create_instance`` the plan may
+    chain other scales of the same model, intermediates are resampled down to the
+    smallest size that still reaches the target before the next pass.
+    A tuning profile of the pass model (core.tuning) overrides ``tileSize`` and
+    the batch size.
+    """
+    h, w, c = img.shape
+    target_h, target_w = target_size(h, w, scale, resizeTo)
+    plan = plan_scale(model, h, w, target_h, target_w, model_registry.models if create_instance else None)
+    runner = PlanRunner(plan, sr_instance, tileSize, canvas_folder, create_instance)
+    with PeakRss() as rss:
+        img_out, _ = runner.run(img, progress)
     sr_instance.processed_img_num += 1
+    return img_out, {**runner.stats(), "peakRssMB": rss.mb}
+
+
+def process_image(
+    sr_instance: OnnxSRInfer,
+    inputImage: str | Path,
+    output_path: str | Path,
+    tileSize: int,
+    scale: int,
+    model: ModelInfo,
+    resizeTo: str | None = None,
+    progress: TaskProgress | None = None,
+    create_instance: Callable[[ModelInfo], OnnxSRInfer] | None = None,
+) -> dict:
+    """sr process: decode, upscale_image and save in one go
+
+    The output format follows the suffix of output_path (core.utils.encode_image).
+    JobQueue runs the three steps of consecutive jobs concurrently instead.
+    """
+    img = load_image(inputImage)
+    img_out, stats = upscale_image(
+        sr_instance, img, Path(output_path).parent, tileSize, scale, model, resizeTo, progress, create_instance
+    )
+    save_image(img_out, output_path)
+    return stats
+
+
+def process_animation(
+    sr_instance: OnnxSRInfer,
+    inputImage: str | Path,
+    output_path: str | Path,
+    tileSize: int,
+    scale: int,
+    model: ModelInfo,
+    resizeTo: str | None = None,
+    progress: TaskProgress | None = None,
+    create_instance: Callable[[ModelInfo], OnnxSRInfer] | None = None,
+) -> dict:
+    """sr process of an animated GIF/WebP, written with the original frame timings
+
+    Frames are decoded, upscaled and encoded one at a time. A frame that differs
+    from the last upscaled one by at most ``animationFrameTolerance`` per pixel
+    only extends its duration, and tiles equal to the previous frame reuse its
+    output. Memory holds the current frame and the previous frame of every pass.
+    """
+    img_in = base_path / inputImage
+    info = animation_info(img_in)
+    frames = read_frames(img_in, info["alpha"])
+    first = next(frames)
+    h, w, c = first[0].shape
+    target_h, target_w = target_size(h, w, scale, resizeTo)
+    plan = plan_scale(model, h, w, target_h, target_w, model_registry.models if create_instance else None)
+    runner = PlanRunner(plan, sr_instance, tileSize, Path(output_path).parent, create_instance)
+    sr_instance.total_img_num = info["frames"]
+    pass_total = info["frames"] * len(plan.steps)
 
-    state_manager.set_process_state("finished")
+    writer = open_writer(output_path, info["loop"])
+    reference = previous = pending = None
+    pending_duration = 0
+    duplicates = 0
+    with PeakRss() as rss:
+        try:
+            for index, (frame, duration) in enumerate(itertools.chain([first], frames)):
+                if (
+                    reference is not None
+                    and animationFrameTolerance is not None
+                    and cv2.absdiff(frame, reference).max() <= animationFrameTolerance
+                ):
+                    # near identical to the last upscaled frame, show that one longer
+                    pending_duration += duration
+                    duplicates += 1
+                else:
+                    if pending is not None:
+                        writer.add(pending, pending_duration)
+                    pending, previous = runner.run(
+                        frame, progress, index * len(plan.steps), pass_total, previous
+                    )
+                    pending_duration = duration
+                    reference = frame
+                sr_instance.processed_img_num += 1
+            writer.add(pending, pending_duration)
+        finally:
+            writer.close()
+    return {
+        **runner.stats(),
+        "frames": info["frames"],
+        "duplicateFrames": duplicates,
+        "reusedTiles": sum(i.reused_tiles for i in runner.instances.values()),
+        "peakRssMB": rss.mb,
+    }
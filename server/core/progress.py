@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+
+from config import progressHistorySize
+from schemas import State
+from .utils import seconds_to_hms
+
+
+LIVE_STATES = ("queued", "processing", "paused")
+
+
+class TaskProgress:
+    """State and tile progress of one task.
+
+    Only the worker running the task writes to it, and every field is a plain
+    attribute assignment, so the tile loop updates it without taking a lock.
+    Readers get a consistent-enough copy through ``to_dict``.
+    """
+
+    __slots__ = (
+        "task_id",
+        "meta",
+        "state",
+        "tiles_done",
+        "tiles_total",
+        "tiles_completed",
+        "pass_index",
+        "pass_total",
+        "img_done",
+        "img_total",
+        "started_at",
+        "updated_at",
+    )
+
+    def __init__(self, task_id: str, meta: dict | None = None) -> None:
+        self.task_id = task_id
+        self.meta = meta if meta is not None else {}
+        self.state: State = "queued"
+        self.tiles_done = 0
+        self.tiles_total = 0
+        # tiles finished over all passes, used for throughput
+        self.tiles_completed = 0
+        self.pass_index = 0
+        self.pass_total = 1
+        self.img_done = 0
+        self.img_total = 1
+        self.started_at: float | None = None
+        self.updated_at = time.time()
+
+    def __call__(
+        self,
+        progress,
+        current_time,
+        total_img_num,
+        processed_img_num,
+        tiles_done=None,
+        tiles_total=None,
+    ):
+        """OnnxSRInfer progress_setter, called after every tile (or tile batch)."""
+        if tiles_done is not None:
+            if tiles_done > self.tiles_done:
+                self.tiles_completed += tiles_done - self.tiles_done
+            else:
+                # a new tile run (next pass or the alpha channel) started
+                self.tiles_completed += tiles_done
+            self.tiles_done = tiles_done
+            self.tiles_total = tiles_total
+        self.img_total = total_img_num
+        self.img_done = processed_img_num
+        self.updated_at = current_time
+
+    def set_state(self, state: State) -> None:
+        if state == "processing" and self.started_at is None:
+            self.started_at = time.time()
+        self.state = state
+        self.updated_at = time.time()
+
+    def start_pass(self, index: int, total: int) -> None:
+        self.pass_index = index
+        self.pass_total = total
+        self.tiles_done = 0
+        self.tiles_total = 0
+
+    @property
+    def throughput(self) -> float | None:
+        """tiles/s since the task started running"""
+        if self.started_at is None or not self.tiles_completed:
+            return None
+        elapsed = self.updated_at - self.started_at
+        return self.tiles_completed / elapsed if elapsed > 0 else None
+
+    @property
+    def eta(self) -> float | None:
+        """seconds left in the current tile run"""
+        throughput = self.throughput
+        if throughput is None or not self.tiles_total:
+            return None
+        return (self.tiles_total - self.tiles_done) / throughput
+
+    def to_dict(self) -> dict:
+        eta = self.eta
+        return {
+            "status": self.state,
+            "tiles_done": self.tiles_done,
+            "tiles_total": self.tiles_total,
+            "pass_index": self.pass_index,
+            "pass_total": self.pass_total,
+            "img_done": self.img_done,
+            "img_total": self.img_total,
+            "progress": self.tiles_done / self.tiles_total if self.tiles_total else None,
+            "throughput": self.throughput,
+            "eta": eta,
+            "eta_str": seconds_to_hms(eta) if eta is not None else "--:--:--",
+            "started_at": self.started_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class ProgressStore:
+    """Task id -> TaskProgress, for O(1) lookups from /tasks and /status.
+
+    The lock only guards adding and dropping entries; lookups and progress
+    updates go straight to the dict and the TaskProgress objects. Finished
+    entries are kept up to ``max_size`` so recent results are served without
+    reading meta.json.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._tasks: OrderedDict[str, TaskProgress] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, task_id: str, meta: dict | None = None) -> TaskProgress:
+        progress = TaskProgress(task_id, meta)
+        with self._lock:
+            self._tasks[task_id] = progress
+            while len(self._tasks) > self.max_size:
+                # drop the oldest finished entry, never a live task
+                for old_id, old in self._tasks.items():
+                    if old.state not in LIVE_STATES:
+                        break
+                else:
+                    break
+                del self._tasks[old_id]
+        return progress
+
+    def get(self, task_id: str) -> TaskProgress | None:
+        return self._tasks.get(task_id)
+
+    def active(self) -> list[TaskProgress]:
+        with self._lock:
+            return [p for p in self._tasks.values() if p.state in LIVE_STATES]
+
+
+progress_store = ProgressStore(progressHistorySize)
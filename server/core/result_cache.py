@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import base_path, resultCacheMaxBytes
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def result_key(input_digest: str, **params) -> str:
+    """Cache key of an input file digest plus every parameter that changes the output"""
+    payload = json.dumps({"input": input_digest, **params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        # other filesystem or no hard link support
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """Content-addressed cache of finished outputs.
+
+    Every cached output is hard linked to ``<root>/<key><suffix>``, so it
+    outlives the task folder it was produced in. A SQLite index keeps the size
+    and last use of each entry; least recently used entries are dropped once
+    the total size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # opened on first use so importing the module does not touch the disk
+        if self._db is None:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.root / "index.db", check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used)")
+        return self._db
+
+    def lookup(self, key: str) -> Path | None:
+        with self._lock:
+            row = self.db.execute("SELECT path FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is not None and not Path(row[0]).exists():
+                self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                self.db.commit()
+                return None
+            self.db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.db.commit()
+            self.hits += 1
+            return Path(row[0])
+
+    def store(self, key: str, output_path: Path) -> None:
+        cached_path = self.root / f"{key}{output_path.suffix}"
+        with self._lock:
+            if not cached_path.exists():
+                link_or_copy(output_path, cached_path)
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries (key, path, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, str(cached_path), cached_path.stat().st_size, time.time()),
+            )
+            self._evict()
+            self.db.commit()
+
+    def _evict(self) -> None:
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, path, size in self.db.execute(
+            "SELECT key, path, size FROM entries ORDER BY last_used"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            Path(path).unlink(missing_ok=True)
+            self.db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "count": count,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+result_cache = ResultCache(base_path / "cache" / "results", resultCacheMaxBytes)
@@ -0,0 +1,153 @@
+"""Chain of model passes that reaches a target size.
+
+For a target larger than one pass of the requested model, every chain of
+up to ``MAX_PASSES`` scales of the same algo and model name is costed, with a resample
+before each later pass down to the smallest input that still reaches the
+target. Chains that resample a pass input below the input of the pass
+before are dropped, that pass was wasted and the next one sees less detail
+than the source. The cheapest remaining chain wins, fewer passes break ties.
+"""
+
+import math
+from dataclasses import dataclass
+
+from schemas import ModelInfo
+from .tuning import load_profile
+
+
+MAX_PASSES = 4
+
+
+@dataclass(frozen=True, slots=True)
+class ScaleStep:
+    model: ModelInfo
+    # (h, w) the image is resampled to before the pass, None to run on it as is
+    resize_to: tuple[int, int] | None
+    input_size: tuple[int, int]
+
+
+@dataclass(frozen=True, slots=True)
+class ScalePlan:
+    steps: list[ScaleStep]
+    target_size: tuple[int, int]
+    cost: float
+    # the requested model, the chain may use other scales of it
+    model: ModelInfo
+
+    @property
+    def output_size(self) -> tuple[int, int]:
+        h, w = self.steps[-1].input_size
+        scale = self.steps[-1].model.scale
+        return h * scale, w * scale
+
+    @property
+    def needs_resize(self) -> bool:
+        return self.output_size != self.target_size
+
+
+def chain_candidates(model: ModelInfo, models: list[ModelInfo]) -> list[ModelInfo]:
+    """One model per scale with the algo and name of model, the requested one first.
+
+    Models with another name are different networks, never swapped in.
+    """
+    by_scale: dict[int, ModelInfo] = {}
+    for m in sorted(models, key=lambda m: m.path != model.path):
+        if m.algo == model.algo and m.name == model.name and m.scale > 1:
+            by_scale.setdefault(m.scale, m)
+    by_scale.setdefault(model.scale, model)
+    return list(by_scale.values())
+
+
+def pass_cost(model: ModelInfo, height: int, width: int, pixels_per_second: dict | None) -> float:
+    if pixels_per_second is not None:
+        return height * width / pixels_per_second[model.path]
+    # without profiles the work of a pass grows with its output size
+    return height * width * model.scale**2
+
+
+def _pixels_per_second(candidates: list[ModelInfo]) -> dict | None:
+    # profile timings and the output size fallback do not mix, use timings only if all have them
+    rates = {}
+    for m in candidates:
+        profile = load_profile(m)
+        results = [r for r in profile["results"] if "error" not in r] if profile else []
+        if not results:
+            return None
+        rates[m.path] = max(r["pixels_per_second"] for r in results)
+    return rates
+
+
+def plan_steps(
+    chain: list[ModelInfo], height: int, width: int, target_h: int, target_w: int
+) -> list[ScaleStep]:
+    steps = []
+    h, w = height, width
+    for i, m in enumerate(chain):
+        resize_to = None
+        if i:
+            remaining = math.prod(s.scale for s in chain[i:])
+            need_h = max(math.ceil(target_h / remaining), 1)
+            need_w = max(math.ceil(target_w / remaining), 1)
+            # never downscale the original, only intermediates
+            if need_h < h or need_w < w:
+                h, w = min(h, need_h), min(w, need_w)
+                resize_to = (h, w)
+        steps.append(ScaleStep(m, resize_to, (h, w)))
+        h, w = h * m.scale, w * m.scale
+    return steps
+
+
+def shrinks_input(steps: list[ScaleStep]) -> bool:
+    """Whether a pass runs on a smaller image than the pass before it"""
+    return any(
+        b.input_size[0] < a.input_size[0] or b.input_size[1] < a.input_size[1]
+        for a, b in zip(steps, steps[1:])
+    )
+
+
+def plan_scale(
+    model: ModelInfo,
+    height: int,
+    width: int,
+    target_h: int,
+    target_w: int,
+    models: list[ModelInfo] | None = None,
+) -> ScalePlan:
+    """Cheapest chain of models upscaling (height, width) to at least (target_h, target_w).
+
+    ``models`` are the models the chain may use, only the requested model when omitted.
+    A x1 model (restoration) is always run alone.
+    """
+    if model.scale == 1:
+        steps = [ScaleStep(model, None, (height, width))]
+        return ScalePlan(steps, (target_h, target_w), pass_cost(model, height, width, None), model)
+
+    candidates = chain_candidates(model, models or [model])
+    rates = _pixels_per_second(candidates)
+    ratio = max(target_h / height, target_w / width)
+
+    best: ScalePlan | None = None
+
+    def search(chain: list[ModelInfo], product: int) -> None:
+        nonlocal best
+        if chain and product >= ratio:
+            steps = plan_steps(chain, height, width, target_h, target_w)
+            if shrinks_input(steps):
+                return
+            cost = sum(pass_cost(s.model, *s.input_size, rates) for s in steps)
+            if best is None or (cost, len(steps)) < (best.cost, len(best.steps)):
+                best = ScalePlan(steps, (target_h, target_w), cost, model)
+            return
+        if len(chain) == MAX_PASSES:
+            return
+        for m in candidates:
+            search(chain + [m], product * m.scale)
+
+    search([], 1)
+    if best is None:
+        # even MAX_PASSES passes of the largest model fall short, upscale the rest by resampling
+        largest = max(candidates, key=lambda m: m.scale)
+        steps = plan_steps([largest] * MAX_PASSES, height, width, target_h, target_w)
+        cost = sum(pass_cost(s.model, *s.input_size, rates) for s in steps)
+        best = ScalePlan(steps, (target_h, target_w), cost, model)
+    return best
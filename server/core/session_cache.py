@@ -0,0 +1,134 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+from config import sessionCacheMaxBytes, sessionCacheSize
+
+if TYPE_CHECKING:
+    import onnxruntime as ort
+
+
+SessionKey = tuple[str, tuple[str, ...], str, int | None]
+
+
+class SessionCache:
+    """Process-wide registry of warm ``ort.InferenceSession`` objects.
+
+    Sessions are keyed by (model path, providers, provider options, intra-op
+    thread count) and evicted least-recently-used first once either the count
+    or the memory budget is exceeded. The memory cost of a session is estimated from its model file
+    size, since onnxruntime does not report it.
+    """
+
+    def __init__(self, max_count: int, max_bytes: int) -> None:
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sessions: OrderedDict[SessionKey, tuple["ort.InferenceSession", int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_locks: dict[SessionKey, threading.Lock] = {}
+
+    @staticmethod
+    def make_key(
+        model_path: str,
+        providers: list[str],
+        provider_options: list[dict] | None,
+        intra_op_threads: int | None = None,
+    ) -> SessionKey:
+        return (
+            os.path.abspath(model_path),
+            tuple(providers),
+            json.dumps(provider_options, sort_keys=True),
+            intra_op_threads,
+        )
+
+    def get(
+        self,
+        model_path: str,
+        providers: list[str],
+        provider_options: list[dict] | None = None,
+        intra_op_threads: int | None = None,
+    ) -> "ort.InferenceSession":
+        key = self.make_key(model_path, providers, provider_options, intra_op_threads)
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+
+        # build outside the registry lock so other models stay available,
+        # but only once per key when several requests miss at the same time
+        with build_lock:
+            with self._lock:
+                entry = self._sessions.get(key)
+                if entry is not None:
+                    self._sessions.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+
+            # imported on the first build, the web layer starts without onnxruntime
+            import onnxruntime as ort
+
+            sess_options = ort.SessionOptions()
+            if intra_op_threads:
+                sess_options.intra_op_num_threads = intra_op_threads
+            sess = ort.InferenceSession(
+                model_path,
+                sess_options=sess_options,
+                providers=providers,
+                provider_options=provider_options,
+            )
+            size = os.path.getsize(model_path)
+
+            with self._lock:
+                self._sessions[key] = (sess, size)
+                self._evict()
+                self._build_locks.pop(key, None)
+            return sess
+
+    def _evict(self) -> None:
+        # always keep the most recently used session, even if it alone is over budget
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_count or self.total_bytes() > self.max_bytes
+        ):
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size in self._sessions.values())
+
+    def discard(self, model_path: str) -> None:
+        """Drop the sessions of a model file, e.g. after it was replaced on disk"""
+        path = os.path.abspath(model_path)
+        with self._lock:
+            for key in [key for key in self._sessions if key[0] == path]:
+                del self._sessions[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "count": len(self._sessions),
+                "bytes": self.total_bytes(),
+                "max_count": self.max_count,
+                "max_bytes": self.max_bytes,
+                "models": [key[0] for key in self._sessions],
+            }
+
+
+session_cache = SessionCache(sessionCacheSize, sessionCacheMaxBytes)
@@ -0,0 +1,229 @@
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from config import base_path, taskCollectInterval, taskMaxAge, taskMaxBytes
+from .progress import LIVE_STATES, progress_store
+from .utils import write_meta
+
+
+logger = logging.getLogger(__name__)
+
+# rows written per transaction when indexing task folders of an older install
+IMPORT_BATCH = 1000
+
+
+def folder_size(folder: Path) -> int:
+    size = 0
+    for root, _, files in os.walk(folder):
+        for name in files:
+            try:
+                size += os.stat(os.path.join(root, name)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+class TaskStore:
+    """SQLite index of the task folders under ``<root>/<id>/``.
+
+    Every meta.json write goes through ``save``, which writes the file
+    atomically and keeps the status, timestamps, folder size and meta of the
+    task in the index. /tasks reads from the index instead of parsing the
+    file. The collector removes finished task folders older than ``max_age``
+    seconds, then the least recently updated ones while the total size is
+    above ``max_bytes``. Tasks still queued or processing are never removed.
+    """
+
+    def __init__(self, root: Path, db_path: Path, max_age: float | None, max_bytes: int | None) -> None:
+        self.root = root
+        self.db_path = db_path
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.collected = 0
+        self.collected_bytes = 0
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        self._collector: threading.Thread | None = None
+        self._stop_collector = threading.Event()
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        # opened on first use so importing the module does not touch the disk
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL, "
+                "size INTEGER NOT NULL, meta TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tasks_updated ON tasks (updated)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status)")
+        return self._db
+
+    def save(self, meta_path: Path, meta: dict) -> None:
+        """Write meta.json and index the task"""
+        write_meta(meta_path, meta)
+        now = time.time()
+        size = folder_size(meta_path.parent)
+        with self._lock:
+            self.db.execute(
+                "INSERT INTO tasks (id, status, created, updated, size, meta) VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (id) DO UPDATE SET status = excluded.status, updated = excluded.updated, "
+                "size = excluded.size, meta = excluded.meta",
+                (meta["id"], meta["status"], now, now, size, json.dumps(meta, ensure_ascii=False)),
+            )
+            self.db.commit()
+
+    def get(self, task_id: str) -> dict | None:
+        with self._lock:
+            row = self.db.execute("SELECT meta FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+        # folders of an older install are indexed by the first collection, until then read the file
+        meta_path = self.root / task_id / "meta.json"
+        if meta_path.resolve().parent.parent != self.root.resolve() or not meta_path.exists():
+            return None
+        with open(meta_path, "r", encoding="utf-8") as meta_file:
+            return json.load(meta_file)
+
+    def list_tasks(self, status: str | None = None, limit: int = 100, offset: int = 0) -> tuple[int, list[dict]]:
+        """(matching tasks, metas of the page), most recently updated first"""
+        where, params = ("WHERE status = ?", (status,)) if status else ("", ())
+        with self._lock:
+            total = self.db.execute(f"SELECT COUNT(*) FROM tasks {where}", params).fetchone()[0]
+            rows = self.db.execute(
+                f"SELECT meta FROM tasks {where} ORDER BY updated DESC LIMIT ? OFFSET ?", (*params, limit, offset)
+            ).fetchall()
+        return total, [json.loads(row[0]) for row in rows]
+
+    def import_folders(self) -> int:
+        """Index task folders that have no row yet, returns how many were added"""
+        if not self.root.is_dir():
+            return 0
+        with self._lock:
+            known = {row[0] for row in self.db.execute("SELECT id FROM tasks")}
+        rows = []
+        added = 0
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if not entry.is_dir() or entry.name in known:
+                    continue
+                folder = Path(entry.path)
+                try:
+                    with open(folder / "meta.json", "r", encoding="utf-8") as meta_file:
+                        meta = json.load(meta_file)
+                except (FileNotFoundError, ValueError):
+                    # interrupted upload or broken meta, dated by the folder
+                    meta = {"id": entry.name, "status": "error"}
+                meta.setdefault("id", entry.name)
+                mtime = entry.stat().st_mtime
+                rows.append(
+                    (entry.name, meta.get("status", "error"), mtime, mtime, folder_size(folder),
+                     json.dumps(meta, ensure_ascii=False))
+                )
+                if len(rows) == IMPORT_BATCH:
+                    added += self._insert(rows)
+                    rows = []
+        return added + self._insert(rows)
+
+    def _insert(self, rows: list[tuple]) -> int:
+        with self._lock:
+            self.db.executemany("INSERT OR IGNORE INTO tasks VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.db.commit()
+        return len(rows)
+
+    def collect(self) -> dict:
+        """Remove expired task folders, then the oldest ones while over max_bytes"""
+        with self._lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM tasks").fetchone()[0]
+        deadline = time.time() - self.max_age if self.max_age is not None else None
+        removed = 0
+        # oldest first, a page at a time so saves are not held up by a large index
+        last = (float("-inf"), "")
+        done = False
+        while not done:
+            with self._lock:
+                rows = self.db.execute(
+                    "SELECT id, status, updated, size FROM tasks WHERE (updated, id) > (?, ?) "
+                    "ORDER BY updated, id LIMIT ?",
+                    (*last, IMPORT_BATCH),
+                ).fetchall()
+            if not rows:
+                break
+            page = []
+            for task_id, status, updated, size in rows:
+                expired = deadline is not None and updated < deadline
+                over_quota = self.max_bytes is not None and total > self.max_bytes
+                if not expired and not over_quota:
+                    # the rest are newer and the quota holds
+                    done = True
+                    break
+                # a task that was queued or processing before a restart has no live progress
+                progress = progress_store.get(task_id)
+                if status in LIVE_STATES and progress is not None and progress.state in LIVE_STATES:
+                    continue
+                shutil.rmtree(self.root / task_id, ignore_errors=True)
+                page.append((task_id, size))
+                total -= size
+            last = rows[-1][2], rows[-1][0]
+            if page:
+                with self._lock:
+                    self.db.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id, _ in page])
+                    self.db.commit()
+                removed += len(page)
+                self.collected += len(page)
+                self.collected_bytes += sum(size for _, size in page)
+        if removed:
+            logger.info("collected %d task folders", removed)
+        return {"removed": removed, "bytes": total}
+
+    def start(self, interval: float | None = taskCollectInterval) -> None:
+        """Index older task folders and collect every interval seconds on a daemon thread"""
+        if interval is None or self._collector is not None:
+            return
+
+        def loop() -> None:
+            try:
+                self.import_folders()
+            except Exception:
+                logger.exception("indexing task folders failed")
+            while not self._stop_collector.is_set():
+                try:
+                    self.collect()
+                except Exception:
+                    logger.exception("task collection failed")
+                self._stop_collector.wait(interval)
+
+        self._collector = threading.Thread(target=loop, name="task-collector", daemon=True)
+        self._collector.start()
+
+    def stop(self) -> None:
+        """Stop the collector thread of start(), a collection in progress is finished first"""
+        if self._collector is None:
+            return
+        self._stop_collector.set()
+        self._collector.join()
+        self._collector = None
+        self._stop_collector.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tasks").fetchone()
+        return {
+            "count": count,
+            "bytes": size,
+            "max_age": self.max_age,
+            "max_bytes": self.max_bytes,
+            "collected": self.collected,
+            "collected_bytes": self.collected_bytes,
+        }
+
+
+task_store = TaskStore(base_path / "tasks", base_path / "tasks.db", taskMaxAge, taskMaxBytes)
@@ -0,0 +1,26 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class CpuPlan:
+    intra_op_threads: int
+    tile_workers: int
+    batch_size: int
+
+
+def plan_cpu_execution(cores: int, tile_size: int, tile_pad: int = 16) -> CpuPlan:
+    """Split CPU cores between concurrent tile workers and onnxruntime intra-op threads.
+
+    A padded tile only has enough work to keep a few threads busy inside one
+    session call, roughly one per 96x96 block, so the remaining cores run
+    other tiles at the same time. Batching gives no extra parallelism on CPU
+    and pads edge tiles, so each worker runs one tile per call.
+    """
+    cores = max(cores, 1)
+    tile_pixels = (tile_size + 2 * tile_pad) ** 2
+    intra_op_threads = max(1, min(cores, tile_pixels // (96 * 96)))
+    return CpuPlan(
+        intra_op_threads=intra_op_threads,
+        tile_workers=max(1, cores // intra_op_threads),
+        batch_size=1,
+    )
@@ -0,0 +1,153 @@
+"""Per-model tile size / batch size tuning.
+
+Profiles are measured on the current host and saved under
+``profiles/<algo>/x<scale>/<name>.json``, mirroring ``models/``.
+process_image picks the tile size of the profile that fits the image,
+/models?details=true shows the chosen profile.
+
+    python -m core.tuning [--model algo:name] [--size 512]
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from config import base_path
+from schemas import ModelInfo
+
+
+TILE_SIZES = (128, 192, 256, 384, 512)
+BATCH_SIZES = (1, 2, 4)
+
+profile_root = base_path / "profiles"
+_profiles: dict[Path, tuple[float, dict]] = {}
+_profiles_lock = threading.Lock()
+
+
+def host_fingerprint() -> dict:
+    import onnxruntime as ort
+
+    return {
+        "cpu_count": os.cpu_count(),
+        "providers": ort.get_available_providers(),
+    }
+
+
+def profile_path(model: ModelInfo) -> Path:
+    return profile_root / model.algo / f"x{model.scale}" / f"{model.name}.json"
+
+
+def load_profile(model: ModelInfo) -> dict | None:
+    """Saved profile of the model, None if missing or measured on a different host"""
+    return load_host_json(profile_path(model))
+
+
+def load_host_json(path: Path) -> dict | None:
+    """JSON measurement file, cached until its mtime changes, None if missing or from a different host"""
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    with _profiles_lock:
+        cached = _profiles.get(path)
+        if cached is None or cached[0] != mtime:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = _profiles[path] = (mtime, json.load(f))
+    profile = cached[1]
+    if profile.get("host") != host_fingerprint():
+        return None
+    return profile
+
+
+def select_tile(profile: dict, height: int, width: int) -> tuple[int, int] | None:
+    """Fastest (tile_size, batch_size) of the profile that is not larger than the image"""
+    results = [r for r in profile["results"] if "error" not in r]
+    if not results:
+        return None
+    fitting = [r for r in results if r["tile_size"] <= max(height, width)]
+    if not fitting:
+        smallest = min(r["tile_size"] for r in results)
+        fitting = [r for r in results if r["tile_size"] == smallest]
+    best = max(fitting, key=lambda r: r["pixels_per_second"])
+    return best["tile_size"], best["batch_size"]
+
+
+def tuned_tile(model: ModelInfo, height: int, width: int) -> tuple[int, int] | None:
+    """(tile_size, batch_size) the profile of model picks for a pass input, None without a profile"""
+    profile = load_profile(model)
+    return select_tile(profile, height, width) if profile else None
+
+
+def tune_model(model: ModelInfo, create_instance, image_size: int = 512) -> dict:
+    """Benchmark every tile size / batch size candidate and save the profile.
+
+    create_instance(model) must return an OnnxSRInfer configured like the one
+    that will serve requests, so the profile matches the real providers.
+    """
+    import numpy as np
+
+    sr_instance = create_instance(model)
+    img = np.random.default_rng(0).integers(0, 256, (image_size, image_size, 3), dtype=np.uint8)
+    batch_sizes = BATCH_SIZES if sr_instance.dynamic_batch else (1,)
+
+    results = []
+    for tile_size in TILE_SIZES:
+        for batch_size in batch_sizes:
+            result = {"tile_size": tile_size, "batch_size": batch_size}
+            sr_instance.batch_size = batch_size
+            try:
+                # first run builds kernels / engines for the shapes
+                sr_instance.tile_process(img, tile_size)
+                start = time.perf_counter()
+                sr_instance.tile_process(img, tile_size)
+                elapsed = time.perf_counter() - start
+                result["seconds"] = round(elapsed, 4)
+                result["pixels_per_second"] = image_size * image_size / elapsed
+            except Exception as e:
+                # e.g. out of device memory for large tiles
+                result["error"] = str(e)
+            results.append(result)
+            print(f"{model.algo}:{model.name} {result}")
+
+    profile = {
+        "model": model.name,
+        "algo": model.algo,
+        "scale": model.scale,
+        "host": host_fingerprint(),
+        "image_size": image_size,
+        "created": time.time(),
+        "results": results,
+    }
+    best = select_tile(profile, image_size, image_size)
+    if best is not None:
+        profile["best"] = {"tile_size": best[0], "batch_size": best[1]}
+
+    path = profile_path(model)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    return profile
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="algo:name, all models when omitted")
+    parser.add_argument("--size", type=int, default=512, help="benchmark image side")
+    args = parser.parse_args()
+
+    from core.jobs import create_sr_instance
+    from core.models import model_registry
+
+    for model in model_registry.models:
+        if args.model and args.model != f"{model.algo}:{model.name}":
+            continue
+        # measured without the CPU thread plan, which is skipped once the model has a profile
+        profile = tune_model(model, lambda m: create_sr_instance(m, cpu_plan=False), args.size)
+        print(f"{model.algo}:{model.name} best: {profile.get('best')}")
+
+
+if __name__ == "__main__":
+    main()
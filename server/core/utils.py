@@ -1,10 +1,19 @@
+import json
+import os
+import tempfile
+import threading
 from pathlib import Path
 from uuid import uuid4
 from fastapi import HTTPException, UploadFile
 from werkzeug.utils import secure_filename
 
 from config import base_path
-from .global_state import state_manager
+
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+# formats that may hold several frames, core.animation upscales them frame by frame
+ANIMATED_SUFFIXES = (".gif", ".webp")
 
 
 def seconds_to_hms(seconds):
@@ -15,34 +24,79 @@ def seconds_to_hms(seconds):
     return f"{int(hours):0>2d}:{int(minutes):0>2d}:{int(seconds):0>2d}"
 
 
-async def upload_file(file: UploadFile, path: Path) -> None:
+async def upload_file(file: UploadFile, path: Path, max_size: int | None = None) -> None:
+    """Stream the upload to path in chunks, 413 once it grows past max_size"""
     path.parent.mkdir(parents=True, exist_ok=True)
 
     # Save file
+    size = 0
     with open(path, "wb") as f:
-        f.write(await file.read())
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                break
+            f.write(chunk)
+    if max_size is not None and size > max_size:
+        path.unlink(missing_ok=True)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File size exceeds limit of {max_size / (1024 * 1024)} MB.",
+        )
 
 
-def progress_setter(progress,current_time,total_img_num,processed_img_num):
+def write_meta(meta_path: Path, meta_data: dict) -> None:
+    """Write JSON through a temporary file and a rename, readers never see a partial file"""
+    fd, tmp_path = tempfile.mkstemp(dir=meta_path.parent, prefix=f".{meta_path.name}.", suffix=".tmp")
     try:
-        global last_progress,last_progress_set_time
-        progress_percent = round(progress*100)
-        total_progress_percent = round((processed_img_num+progress)/total_img_num*100)
-        etr_str = "--:--:--"
-        total_etr_str = "--:--:--"
-        if state_manager.last_progress is not None and state_manager.last_progress_set_time:
-            etr = (current_time-state_manager.last_progress_set_time) * (1-state_manager.last_progress)/(progress-state_manager.last_progress)
-            total_etr = (current_time-state_manager.last_progress_set_time) * (total_img_num-processed_img_num-state_manager.last_progress)/(progress-state_manager.last_progress)
-            etr_str = seconds_to_hms(etr)
-            total_etr_str = seconds_to_hms(total_etr)
-        progress_str = f"{progress_percent}% ETR:{etr_str}"
-        total_progress_str = f"{total_progress_percent}% ETR:{total_etr_str}"
-        # eel.handleSetProgress(progress_percent,progress_str,total_progress_str)
-        last_progress = progress
-        last_progress_set_time = current_time
-
-        print(f"Progress: {progress_str}, Total Progress: {total_progress_str}, Processed: {processed_img_num}/{total_img_num}")
-    except Exception as e:
-        print(f"Error in progress_setter: {str(e)}")
-        # eel.showError(f"Error in progress_setter: {str(e)}")
-        return False
+        with os.fdopen(fd, "w", encoding="utf-8") as meta_file:
+            json.dump(meta_data, meta_file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, meta_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def rss_mb() -> float | None:
+    """Current resident set size of the server process, None where /proc is missing"""
+    try:
+        with open("/proc/self/statm", "rb") as statm:
+            pages = int(statm.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * PAGE_SIZE / 1024 / 1024
+
+
+class PeakRss:
+    """Highest resident set size of the process while the block runs.
+
+    Sampled every ``interval`` seconds on a daemon thread, so a spike
+    shorter than that can be missed. Jobs running at the same time share
+    the process, their peaks include each other.
+    """
+
+    def __init__(self, interval: float = 0.05) -> None:
+        self.interval = interval
+        self.mb: float | None = None
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def sample(self) -> None:
+        current = rss_mb()
+        if current is not None and (self.mb is None or current > self.mb):
+            self.mb = current
+
+    def __enter__(self) -> "PeakRss":
+        self.sample()
+
+        def run() -> None:
+            while not self._stop.wait(self.interval):
+                self.sample()
+
+        self._thread = threading.Thread(target=run, name="peak-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.sample()
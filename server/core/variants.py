@@ -0,0 +1,216 @@
+"""Reduced precision (fp16 / INT8) variants of the models.
+
+``export`` writes ``<name>.fp16.onnx`` and ``<name>.int8.onnx`` next to each
+fp32 model in ``models/<algo>/x<scale>/`` (core.models lists them as variants
+after a restart). ``report`` upscales a reference image set with every
+variant and saves PSNR/SSIM against the fp32 output and the latency to
+``profiles/<algo>/x<scale>/<name>.variants.json``. With ``variantMinPsnr``
+set, jobs run the fastest variant of the report that stays above it.
+
+    python -m core.variants export [--model algo:name] [--int8 dynamic|static] [--calibration DIR]
+    python -m core.variants report [--model algo:name] [--images DIR]
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from config import variantMinPsnr
+from schemas import ModelInfo
+from .image_io import decode_image
+from .models import variants_of
+from .tuning import host_fingerprint, load_host_json, profile_root
+
+
+CALIBRATION_TILE = 64
+
+
+def variant_path(model: ModelInfo, variant: str) -> Path:
+    return Path(model.path).with_suffix(f".{variant}.onnx")
+
+
+def report_path(model: ModelInfo) -> Path:
+    return profile_root / model.algo / f"x{model.scale}" / f"{model.name}.variants.json"
+
+
+def reference_images(folder: Path | None = None) -> list[np.ndarray]:
+    """BGR images of folder, or synthetic ones with flat areas, edges and texture"""
+    if folder is not None:
+        return [decode_image(np.fromfile(f, dtype=np.uint8)) for f in sorted(folder.iterdir()) if f.is_file()]
+    rng = np.random.default_rng(0)
+    images = []
+    for size in (256, 384):
+        img = np.full((size, size, 3), (230, 215, 245), dtype=np.uint8)
+        cv2.circle(img, (size // 3, size // 3), size // 6, (40, 90, 200), -1)
+        cv2.rectangle(img, (size // 2, size // 2), (size - 30, size - 60), (30, 30, 30), 3)
+        cv2.putText(img, "MoeSR", (10, size - 15), cv2.FONT_HERSHEY_SIMPLEX, size / 200, (0, 0, 0), 3)
+        texture = rng.integers(0, 256, (size // 4, size // 4, 3), dtype=np.uint8)
+        img[: size // 4, -size // 4 :] = texture
+        images.append(img)
+    return images
+
+
+class CalibrationReader:
+    """Session inputs for static quantization, tiles of the reference images.
+
+    Duck-types onnxruntime.quantization.CalibrationDataReader, so the server
+    does not import the quantization tooling.
+    """
+
+    def __init__(self, images: list[np.ndarray]) -> None:
+        self.tiles = []
+        for img in images:
+            for y in range(0, img.shape[0] - CALIBRATION_TILE + 1, CALIBRATION_TILE * 2):
+                for x in range(0, img.shape[1] - CALIBRATION_TILE + 1, CALIBRATION_TILE * 2):
+                    tile = img[y : y + CALIBRATION_TILE, x : x + CALIBRATION_TILE, 0:3]
+                    # same preprocessing as OnnxSRInfer.infer_tiles
+                    self.tiles.append(tile[:, :, ::-1].transpose(2, 0, 1)[None] / np.float32(255.0))
+        self.index = 0
+
+    def get_next(self) -> dict | None:
+        if self.index == len(self.tiles):
+            return None
+        self.index += 1
+        return {"input": self.tiles[self.index - 1]}
+
+    def rewind(self) -> None:
+        self.index = 0
+
+
+def export_fp16(model: ModelInfo) -> Path:
+    import onnx
+    from onnxruntime.transformers.float16 import convert_float_to_float16
+
+    path = variant_path(model, "fp16")
+    # float32 inputs/outputs keep the OnnxSRInfer buffers unchanged
+    onnx.save(convert_float_to_float16(onnx.load(model.path), keep_io_types=True), path)
+    return path
+
+
+def export_int8(model: ModelInfo, mode: str = "dynamic", images: list[np.ndarray] | None = None) -> Path:
+    from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+    path = variant_path(model, "int8")
+    if mode == "dynamic":
+        quantize_dynamic(model.path, path, weight_type=QuantType.QInt8)
+    else:
+        reader = CalibrationReader(images if images is not None else reference_images())
+        quantize_static(model.path, path, reader, quant_format=QuantFormat.QDQ, per_channel=True)
+    return path
+
+
+def psnr(a: np.ndarray, b: np.ndarray) -> float:
+    mse = np.mean((a.astype(np.float64) - b.astype(np.float64)) ** 2)
+    return float("inf") if mse == 0 else float(10 * np.log10(255.0**2 / mse))
+
+
+def ssim(a: np.ndarray, b: np.ndarray) -> float:
+    """Mean SSIM over all channels, 11x11 gaussian window"""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+
+    def blur(x):
+        return cv2.GaussianBlur(x, (11, 11), 1.5)
+
+    mu_a = blur(a)
+    mu_b = blur(b)
+    var_a = blur(a * a) - mu_a**2
+    var_b = blur(b * b) - mu_b**2
+    cov = blur(a * b) - mu_a * mu_b
+    ssim_map = ((2 * mu_a * mu_b + c1) * (2 * cov + c2)) / ((mu_a**2 + mu_b**2 + c1) * (var_a + var_b + c2))
+    return float(ssim_map.mean())
+
+
+def compare_variants(model: ModelInfo, create_instance, images: list[np.ndarray], tile_size: int = 192) -> dict:
+    """Quality against fp32 and latency of every variant of the model, saved as its report"""
+    outputs = []
+    variants = []
+    for variant in variants_of(model):
+        result = {"variant": variant.variant}
+        try:
+            sr_instance = create_instance(variant)
+            # first run builds kernels / engines for the tile shapes
+            sr_instance.universal_process_pipeline(images[0], tile_size)
+            start = time.perf_counter()
+            upscaled = [sr_instance.universal_process_pipeline(img, tile_size) for img in images]
+            result["seconds"] = round(time.perf_counter() - start, 4)
+            if variant.variant == "fp32":
+                outputs = upscaled
+            else:
+                result["psnr"] = round(float(np.mean([psnr(a, b) for a, b in zip(outputs, upscaled)])), 3)
+                result["ssim"] = round(float(np.mean([ssim(a, b) for a, b in zip(outputs, upscaled)])), 5)
+        except Exception as e:
+            # e.g. operators without fp16 / int8 kernels on this provider
+            result["error"] = str(e)
+        variants.append(result)
+        print(f"{model.algo}:{model.name} {result}")
+
+    report = {
+        "model": model.name,
+        "algo": model.algo,
+        "scale": model.scale,
+        "host": host_fingerprint(),
+        "images": len(images),
+        "tile_size": tile_size,
+        "created": time.time(),
+        "variants": variants,
+    }
+    path = report_path(model)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return report
+
+
+def load_report(model: ModelInfo) -> dict | None:
+    return load_host_json(report_path(model))
+
+
+def select_variant(model: ModelInfo, min_psnr: float | None = variantMinPsnr) -> ModelInfo:
+    """Fastest variant of the report whose PSNR against fp32 is at least min_psnr, the model itself by default"""
+    report = load_report(model) if min_psnr is not None else None
+    if report is None:
+        return model
+    available = {v.variant: v for v in variants_of(model)}
+    candidates = [
+        r
+        for r in report["variants"]
+        if "error" not in r and r["variant"] in available and (r["variant"] == "fp32" or r["psnr"] >= min_psnr)
+    ]
+    if not candidates:
+        return model
+    return available[min(candidates, key=lambda r: r["seconds"])["variant"]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "report"])
+    parser.add_argument("--model", help="algo:name, all models when omitted")
+    parser.add_argument("--int8", choices=["dynamic", "static"], default="dynamic")
+    parser.add_argument("--calibration", type=Path, help="images for static INT8 calibration")
+    parser.add_argument("--images", type=Path, help="reference images, synthetic ones when omitted")
+    parser.add_argument("--tile", type=int, default=192)
+    args = parser.parse_args()
+
+    from core.jobs import create_sr_instance
+    from core.models import model_registry
+
+    for model in model_registry.models:
+        if args.model and args.model != f"{model.algo}:{model.name}":
+            continue
+        if args.command == "export":
+            print(export_fp16(model))
+            calibration = reference_images(args.calibration) if args.int8 == "static" else None
+            print(export_int8(model, args.int8, calibration))
+        else:
+            compare_variants(model, create_sr_instance, reference_images(args.images), args.tile)
+
+
+if __name__ == "__main__":
+    main()
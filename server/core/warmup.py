@@ -0,0 +1,91 @@
+"""Startup timings, warm-up and readiness.
+
+Importing app only loads the web layer, /health and /models answer without
+onnxruntime, cv2 or numpy. ``start`` runs the warm-up on a background
+thread: it imports the inference stack, then builds the session of every
+``warmupModels`` entry through the session cache the jobs use and upscales
+a small noise image with it, so TensorRT engines and CUDA kernels exist
+before the first request. /health/ready answers 503 until it is done,
+/health stays the liveness check.
+"""
+
+import logging
+import threading
+import time
+
+from config import tileSize, warmupModels
+from .models import model_registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class Startup:
+    def __init__(self) -> None:
+        # seconds per startup stage, in the order they finished
+        self.timings: dict[str, float] = {}
+        # "algo:name" -> warm-up result of the model
+        self.models: dict[str, dict] = {}
+        self.ready = False
+        self._thread: threading.Thread | None = None
+
+    def record(self, stage: str, seconds: float) -> None:
+        self.timings[stage] = round(seconds, 4)
+
+    def warm_up(self, models: list[str]) -> None:
+        start = time.perf_counter()
+        import numpy as np
+
+        from .jobs import create_sr_instance
+        # the modules a job runs through, imported now instead of by the first job
+        from . import batch, process  # noqa: F401
+        from .variants import select_variant
+
+        self.record("inference_import", time.perf_counter() - start)
+
+        start = time.perf_counter()
+        # noise, so no tile is taken for flat and resized instead of inferred
+        img = np.random.default_rng(0).integers(0, 256, (tileSize * 2, tileSize * 2, 3), dtype=np.uint8)
+        for entry in models:
+            algo, _, name = entry.partition(":")
+            model = model_registry.get(algo, name)
+            if model is None:
+                self.models[entry] = {"error": "Model not found."}
+                continue
+            try:
+                variant = select_variant(model)
+                built = time.perf_counter()
+                sr_instance = create_sr_instance(variant)
+                session_seconds = time.perf_counter() - built
+                ran = time.perf_counter()
+                sr_instance.universal_process_pipeline(img, tileSize)
+                self.models[entry] = {
+                    "variant": variant.variant,
+                    "session_seconds": round(session_seconds, 4),
+                    "run_seconds": round(time.perf_counter() - ran, 4),
+                }
+            except Exception as e:
+                logger.exception("warm-up of %s failed", entry)
+                self.models[entry] = {"error": str(e)}
+        self.record("warm_up", time.perf_counter() - start)
+
+    def start(self, models: list[str] = warmupModels) -> None:
+        """Warm up on a daemon thread, ready once it is done (also when a model failed)"""
+        if self._thread is not None:
+            return
+
+        def run() -> None:
+            try:
+                self.warm_up(models)
+            except Exception:
+                logger.exception("warm-up failed")
+            self.ready = True
+
+        self._thread = threading.Thread(target=run, name="warm-up", daemon=True)
+        self._thread.start()
+
+    def to_dict(self) -> dict:
+        return {"ready": self.ready, "timings": self.timings, "models": self.models}
+
+
+startup = Startup()
@@ -0,0 +1,102 @@
+import shutil
+from typing import Annotated
+from uuid import uuid4
+
+from fastapi import APIRouter, File, Form, UploadFile, HTTPException, status
+
+from config import MAX_ARCHIVE_SIZE, base_path, batchFolderRoot
+from core.jobs import Job, QueueFullError, job_queue
+from core.models import model_registry
+from core.progress import progress_store
+from core.task_store import task_store
+from core.utils import upload_file
+from schemas import Priority
+from .run_process import task_response
+
+
+router = APIRouter(
+    prefix="/batch",
+    tags=["batch"],
+)
+
+
+@router.post("", status_code=status.HTTP_201_CREATED)
+async def py_run_batch(
+    scale: Annotated[int, Form(ge=1, le=16)],
+    model: Annotated[str, Form(pattern="^[a-zA-Z0-9_-]+:[a-zA-Z0-9_-]+$")],
+    archive: Annotated[UploadFile | None, File()] = None,
+    folder: Annotated[str | None, Form()] = None,
+    isSkipAlpha: Annotated[bool, Form()] = False,
+    priority: Annotated[Priority, Form()] = "normal",
+):
+    """批量处理 zip 压缩包或服务器目录中的所有图片，结果打包为 zip"""
+    algoName, modelName = model.split(":", 1)
+
+    if (archive is None) == (folder is None):
+        raise HTTPException(status_code=400, detail="Provide either an archive or a folder.")
+
+    source_folder = None
+    if folder is not None:
+        # only folders below batchFolderRoot can be read
+        root = batchFolderRoot.resolve()
+        source_folder = (root / folder).resolve()
+        if not source_folder.is_relative_to(root) or not source_folder.is_dir():
+            raise HTTPException(status_code=400, detail="Folder not found.")
+    elif not (archive.filename and archive.filename.lower().endswith(".zip")):
+        raise HTTPException(status_code=400, detail="Invalid file type. Allowed types: zip.")
+
+    model_obj = model_registry.get(algoName, modelName, scale)
+    if model_obj is None:
+        raise HTTPException(status_code=404, detail="Model not found.")
+
+    if job_queue.is_full():
+        raise HTTPException(status_code=429, detail="Too many queued tasks.")
+
+    id = str(uuid4())
+    folder_path = base_path / "tasks" / id
+    output_path = folder_path / "output.zip"
+    meta_path = folder_path / "meta.json"
+
+    if archive is not None:
+        input_path = folder_path / "input.zip"
+        try:
+            await upload_file(archive, input_path, MAX_ARCHIVE_SIZE)
+        except HTTPException:
+            shutil.rmtree(folder_path, ignore_errors=True)
+            raise
+    else:
+        folder_path.mkdir(parents=True, exist_ok=True)
+        input_path = source_folder
+
+    meta_data = {
+        "status": "queued",
+        "id": id,
+        "model": model_obj.name,
+        "algo": model_obj.algo,
+        "scale": scale,
+        "priority": priority,
+        "input": archive.filename if archive is not None else folder,
+        "batch": True,
+    }
+    task_store.save(meta_path, meta_data)
+
+    job = Job(
+        id=id,
+        model=model_obj,
+        scale=scale,
+        input_path=input_path,
+        output_path=output_path,
+        meta_path=meta_path,
+        meta=meta_data,
+        progress=progress_store.create(id, meta_data),
+        skip_alpha=isSkipAlpha,
+        priority=priority,
+        batch=True,
+    )
+    try:
+        job_queue.submit(job)
+    except QueueFullError as e:
+        shutil.rmtree(folder_path, ignore_errors=True)
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return task_response("queued", id, output_path, model_obj)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+
+from core.result_cache import result_cache
+
+
+router = APIRouter(prefix="/cache", tags=["cache"])
+
+
+@router.get("")
+def get_cache_stats():
+    """结果缓存命中统计"""
+    return result_cache.stats()
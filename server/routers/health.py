@@ -1,5 +1,11 @@
+import sys
+
 from fastapi import APIRouter
-import onnxruntime as ort
+from fastapi.responses import JSONResponse
+
+from core.session_cache import session_cache
+from core.task_store import task_store
+from core.warmup import startup
 
 
 router = APIRouter(prefix="/health", tags=["health"])
@@ -7,15 +13,28 @@ router = APIRouter(prefix="/health", tags=["health"])
 
 @router.get("")
 async def health_check():
-    available_providers = ort.get_available_providers()
-
-    gpu_info = {
-        "onnxruntime_providers": available_providers,
-        "cuda_available": "CUDAExecutionProvider" in available_providers,
-        "tensorrt_available": "TensorrtExecutionProvider" in available_providers,
-    }
+    """存活检查，不加载推理模块"""
+    gpu_info = None
+    # reported once the warm-up or a job has loaded onnxruntime
+    if "onnxruntime" in sys.modules:
+        available_providers = sys.modules["onnxruntime"].get_available_providers()
+        gpu_info = {
+            "onnxruntime_providers": available_providers,
+            "cuda_available": "CUDAExecutionProvider" in available_providers,
+            "tensorrt_available": "TensorrtExecutionProvider" in available_providers,
+        }
 
     return {
         "status": "OK",
+        "ready": startup.ready,
         "gpu_support": gpu_info,
+        "session_cache": session_cache.stats(),
+        "tasks": task_store.stats(),
+        "startup": startup.to_dict(),
     }
+
+
+@router.get("/ready")
+async def readiness_check():
+    """就绪检查，预热完成前返回 503"""
+    return JSONResponse(status_code=200 if startup.ready else 503, content=startup.to_dict())
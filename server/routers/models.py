@@ -1,14 +1,43 @@
 from fastapi import APIRouter
 
-from core.models import model_list
+from core.models import model_registry, variants_of
+from core.tuning import load_profile
 
 router = APIRouter(prefix="/models", tags=["models"])
 
 
 @router.get("")
-def get_models():
-    """返回按 algo 分类的 model 名称列表"""
+def get_models(details: bool = False):
+    """返回按 algo 分类的 model 名称列表，details=true 时附带 scale、输入输出信息、调优结果和精度变体"""
+    if details:
+        from core.variants import load_report, select_variant
+
+        detailed: dict[str, list[dict]] = {}
+        for model in model_registry.models:
+            profile = load_profile(model)
+            report = load_report(model)
+            measured = {r["variant"]: r for r in report["variants"]} if report else {}
+            detailed.setdefault(model.algo, []).append(
+                {
+                    "name": model.name,
+                    "scale": model.scale,
+                    "probe": model_registry.probe(model),
+                    "profile": profile.get("best") if profile else None,
+                    "variants": [
+                        {"variant": v.variant, **measured.get(v.variant, {})} for v in variants_of(model)
+                    ],
+                    "selectedVariant": select_variant(model).variant,
+                }
+            )
+        return detailed
+
     result: dict[str, list[str]] = {}
-    for model in model_list:
+    for model in model_registry.models:
         result.setdefault(model.algo, []).append(model.name)
     return result
+
+
+@router.post("/rescan")
+def rescan_models():
+    """重新扫描 models 目录，返回新增、变更和删除的模型文件"""
+    return model_registry.rescan()
@@ -1,25 +1,30 @@
-import json
-import os
-import traceback
+import shutil
 from pathlib import Path
 from typing import Annotated
 from uuid import uuid4
 
 from fastapi import APIRouter, File, Form, UploadFile, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 
 from config import (
     ALLOWED_EXTENSIONS,
-    gpuid,
-    tileSize,
+    MAX_FILE_SIZE,
+    animationFrameTolerance,
     base_path,
-    base_url,
+    flatTileVariance,
+    jpegQuality,
+    outputFormat,
+    pngCompression,
+    tileSize,
+    webpQuality,
 )
-from core.onnx_infer import OnnxSRInfer
-from core.global_state import state_manager
-from core.models import model_list
-from core.process import process_image
-from core.utils import progress_setter, upload_file
-from schemas import ModelInfo
+from core.jobs import Job, QueueFullError, job_queue, output_url
+from core.models import max_output_pixels, model_registry
+from core.progress import progress_store
+from core.result_cache import file_digest, link_or_copy, result_cache, result_key
+from core.task_store import task_store
+from core.utils import ANIMATED_SUFFIXES, upload_file
+from schemas import ModelInfo, Priority
 
 
 router = APIRouter(
@@ -28,16 +33,69 @@ router = APIRouter(
 )
 
 
+def task_response(status: str, id: str, output_path: Path, model: ModelInfo) -> dict:
+    return {
+        "status": status,
+        "id": id,
+        "outputPath": output_path,
+        "outputUrl": output_url(output_path),
+        "modelName": model.name,
+        "scale": model.scale,
+        "algo": model.algo,
+    }
+
+
+def check_image(input_path: Path, scale: int, model: ModelInfo) -> tuple[int, int]:
+    """(width, height) of the image, 422 for unreadable headers, 413 when the output would exceed
+    the pixel limit of the model"""
+    from core.image_io import read_image_header
+
+    try:
+        width, height, _ = read_image_header(input_path)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    limit = max_output_pixels(model)
+    if width * height * scale * scale > limit:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Output of {width * scale}x{height * scale} exceeds the limit of {limit} pixels.",
+        )
+    return width, height
+
+
+def planned_passes(model: ModelInfo, width: int, height: int, scale: int) -> list:
+    """Model, file version, input size and (tile, batch) of every pass the job will run, for the result key"""
+    from core.jobs import execution_settings
+    from core.scale_plan import plan_scale
+    from core.tuning import tuned_tile
+    from core.variants import select_variant
+
+    plan = plan_scale(model, height, width, height * scale, width * scale, model_registry.models)
+    passes = []
+    for step in plan.steps:
+        variant = select_variant(step.model)
+        # the profile picks the tile and batch, otherwise the instance keeps its own batch size
+        tile = tuned_tile(step.model, *step.input_size) or (tileSize, execution_settings(variant)[0])
+        passes.append([
+            f"{step.model.algo}:{step.model.name}",
+            step.model.scale,
+            variant.variant,
+            # a replaced model file gives new results
+            model_registry.version(variant),
+            list(step.input_size),
+            list(tile),
+        ])
+    return passes
+
+
 @router.post("", status_code=status.HTTP_201_CREATED)
 async def py_run_process(
     scale: Annotated[int, Form(ge=1, le=16)],
     model: Annotated[str, Form(pattern="^[a-zA-Z0-9_-]+:[a-zA-Z0-9_-]+$")],
     image: Annotated[UploadFile, File()],
     isSkipAlpha: Annotated[bool, Form()] = False,
+    priority: Annotated[Priority, Form()] = "normal",
 ):
-    if state_manager.last_state == "processing":
-        raise HTTPException(status_code=400, detail="A process is already running.")
-
     algoName, modelName = model.split(":", 1)
 
     # 检查文件类型和大小
@@ -53,109 +111,127 @@ async def py_run_process(
             detail=f"Invalid file type. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}.",
         )
 
-    # contents = await image.read()
-    # if len(contents) > MAX_FILE_SIZE:
-    #     raise HTTPException(
-    #         status_code=413,
-    #         detail=f"File size exceeds limit of {MAX_FILE_SIZE / (1024 * 1024)} MB.",
-    #     )
+    model_obj = model_registry.get(algoName, modelName, scale)
+    if model_obj is None:
+        raise HTTPException(status_code=404, detail="Model not found.")
 
-    try:
-        state_manager.set_process_state("processing")
-        # Save the uploaded file
-        # Generate a unique folder path
-        id = str(uuid4())
-        folder_path = base_path / "tasks" / id
-
-        # Generate input file name
-        extension = filename.rsplit(".", 1)[1].lower()
-        input_filename = f"input.{extension}"
-
-        input_path = folder_path / input_filename
-        output_path = folder_path / "output.png"
-        meta_path = folder_path / "meta.json"
-
-        await upload_file(image, input_path)
-
-        # find model info
-        model_obj = ModelInfo("", "", 4, "")
-        provider_options = None
-        if gpuid >= 0:
-            provider_options = [
-                {
-                    "device_id": 0,
-                    "trt_fp16_enable": True,
-                    "trt_engine_cache_enable": True,
-                    "trt_engine_cache_path": "./trt_cache",
-                },
-                {"device_id": gpuid},
-            ]
-        for m in model_list:
-            if m.name == modelName and m.algo == algoName:
-                model_obj = m
-                break
-
-        # 写入 meta
-        meta_data = {
-            "status": "processing",
-            "id": id,
-            "model": model_obj.name,
-            "algo": model_obj.algo,
-            "scale": scale,
-            "input": filename,
-        }
-
-        with open(meta_path, "w", encoding="utf-8") as meta_file:
-            json.dump(meta_data, meta_file, ensure_ascii=False, indent=2)
-
-        # init sr instance
-        sr_instance = OnnxSRInfer(
-            model_obj.path,
-            model_obj.scale,
-            model_obj.name,
-            providers=[
-                "TensorrtExecutionProvider",
-                "CUDAExecutionProvider",
-            ],
-            provider_options=provider_options,
-            progress_setter=progress_setter,
-        )
+    # fail fast before reading the upload, submit() still guards the race
+    if job_queue.is_full():
+        raise HTTPException(status_code=429, detail="Too many queued tasks.")
 
-        print(f"Using providers: {sr_instance.sess.get_providers()}")
+    # Save the uploaded file
+    # Generate a unique folder path
+    id = str(uuid4())
+    folder_path = base_path / "tasks" / id
 
-        # skip alpha sr
-        if isSkipAlpha:
-            sr_instance.alpha_upsampler = "interpolation"
+    # Generate input file name
+    extension = filename.rsplit(".", 1)[1].lower()
+    input_filename = f"input.{extension}"
 
-        process_image(
-            sr_instance,
-            input_path,
-            output_path,
-            tileSize,
-            scale,
-            model_obj,
-        )
-        # Ensure output_path is relative to base_path for correct URL
-        rel_output_path = str(Path(output_path).relative_to(base_path))
-
-        # 更新 meta.json 状态为 finished，并包含输出url
-        meta_data["status"] = "finished"
-        meta_data["outputUrl"] = f"{base_url}/{rel_output_path.replace(os.sep, '/')}"
-        with open(meta_path, "w", encoding="utf-8") as meta_file:
-            json.dump(meta_data, meta_file, ensure_ascii=False, indent=2)
-
-        return {
-            "status": "success",
-            "id": id,
-            "outputPath": output_path,
-            "outputUrl": f"{base_url}/{rel_output_path.replace(os.sep, '/')}",
-            "modelName": model_obj.name,
-            "scale": model_obj.scale,
-            "algo": model_obj.algo,
-        }
-
-    except Exception as e:
-        error_message = traceback.format_exc()
-        state_manager.show_error(error_message)
-        state_manager.set_process_state("error")
-        raise HTTPException(status_code=500, detail=str(e))
+    input_path = folder_path / input_filename
+
+    try:
+        await upload_file(image, input_path, MAX_FILE_SIZE)
+    except HTTPException:
+        shutil.rmtree(folder_path, ignore_errors=True)
+        raise
+
+    # hashing, header parsing, profile loading and SQLite writes stay off the event loop
+    return await run_in_threadpool(
+        queue_task, id, filename, input_path, model_obj, scale, isSkipAlpha, priority
+    )
+
+
+def queue_task(
+    id: str,
+    filename: str,
+    input_path: Path,
+    model_obj: ModelInfo,
+    scale: int,
+    isSkipAlpha: bool,
+    priority: Priority,
+) -> dict:
+    """Answer from the result cache or queue the job of an uploaded image"""
+    from core.animation import is_animated
+    from core.variants import select_variant
+
+    folder_path = input_path.parent
+    extension = input_path.suffix.lstrip(".")
+    meta_path = folder_path / "meta.json"
+
+    # animations keep their format, still images use the configured one
+    animated = f".{extension}" in ANIMATED_SUFFIXES and is_animated(input_path)
+    output_extension = extension if animated else outputFormat
+    output_path = folder_path / f"output.{output_extension}"
+
+    # 解码前根据文件头检查尺寸
+    try:
+        width, height = check_image(input_path, scale, model_obj)
+    except HTTPException:
+        shutil.rmtree(folder_path, ignore_errors=True)
+        raise
+
+    # 写入 meta
+    meta_data = {
+        "status": "queued",
+        "id": id,
+        "model": model_obj.name,
+        "algo": model_obj.algo,
+        "scale": scale,
+        "priority": priority,
+        "input": filename,
+    }
+
+    # same input and parameters as an earlier task: reuse its output
+    variant = select_variant(model_obj)
+    cache_key = result_key(
+        file_digest(input_path),
+        algo=model_obj.algo,
+        model=model_obj.name,
+        scale=scale,
+        isSkipAlpha=isSkipAlpha,
+        tileSize=tileSize,
+        # tuning profiles override tileSize and the batch size, batch padding changes the output
+        passes=planned_passes(model_obj, width, height, scale),
+        # which frames are merged into the previous one
+        animationFrameTolerance=animationFrameTolerance if animated else None,
+        flatTileVariance=flatTileVariance,
+        variant=variant.variant,
+        # a replaced model file gives new results
+        modelVersion=model_registry.version(variant),
+        outputFormat=output_extension,
+        pngCompression=pngCompression,
+        webpQuality=webpQuality,
+        jpegQuality=jpegQuality,
+    )
+    cached_path = result_cache.lookup(cache_key)
+    if cached_path is not None:
+        link_or_copy(cached_path, output_path)
+        meta_data.update(status="finished", outputUrl=output_url(output_path), cached=True)
+        task_store.save(meta_path, meta_data)
+        progress_store.create(id, meta_data).set_state("finished")
+        return task_response("finished", id, output_path, model_obj)
+
+    task_store.save(meta_path, meta_data)
+
+    job = Job(
+        id=id,
+        model=model_obj,
+        scale=scale,
+        input_path=input_path,
+        output_path=output_path,
+        meta_path=meta_path,
+        meta=meta_data,
+        progress=progress_store.create(id, meta_data),
+        skip_alpha=isSkipAlpha,
+        animated=animated,
+        priority=priority,
+        cache_key=cache_key,
+    )
+    try:
+        job_queue.submit(job)
+    except QueueFullError as e:
+        shutil.rmtree(folder_path, ignore_errors=True)
+        raise HTTPException(status_code=429, detail=str(e))
+
+    return task_response("queued", id, output_path, model_obj)
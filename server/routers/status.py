@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
-from core.global_state import state_manager
+from core.jobs import job_queue
+from core.progress import progress_store
 
 
 router = APIRouter(prefix="/status", tags=["status"])
@@ -9,8 +10,20 @@ router = APIRouter(prefix="/status", tags=["status"])
 @router.get("")
 def get_task_status():
     """获取任务状态"""
+    active = progress_store.active()
+    running = [p for p in active if p.state == "processing"]
+    # the most recently updated running task stands in for the old single-task fields
+    latest = max(running, key=lambda p: p.updated_at, default=None)
+    if running:
+        status = "processing"
+    elif active:
+        status = "queued"
+    else:
+        status = "idle"
     return {
-        "status": state_manager.last_state,
-        "last_progress": state_manager.last_progress,
-        "last_progress_set_time": state_manager.last_progress_set_time,
+        "status": status,
+        "last_progress": latest.to_dict()["progress"] if latest else None,
+        "last_progress_set_time": latest.updated_at if latest else None,
+        "queue_depth": job_queue.depth(),
+        "tasks": {p.task_id: p.to_dict() for p in active},
     }
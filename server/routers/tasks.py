@@ -1,7 +1,19 @@
+import asyncio
 import json
-from fastapi import APIRouter, HTTPException
+import time
+from typing import Annotated
 
-from config import base_path
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from config import progressEventRate
+from core.jobs import job_queue
+from core.progress import LIVE_STATES, progress_store
+from core.task_store import task_store
+from schemas import State
+
+# comment line sent when nothing changed for this long, keeps proxies from closing the stream
+KEEPALIVE_INTERVAL = 15
 
 
 router = APIRouter(
@@ -10,12 +22,80 @@ router = APIRouter(
 )
 
 
+@router.get("")
+def list_tasks(
+    status: State | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    offset: Annotated[int, Query(ge=0)] = 0,
+):
+    """按更新时间倒序列出任务，可按状态筛选"""
+    total, tasks = task_store.list_tasks(status, limit, offset)
+    return {"total": total, "tasks": tasks}
+
+
 @router.get("/{task_id}")
 async def get_task(task_id: str):
     """获取任务状态"""
-    meta_path = base_path / "tasks" / task_id / "meta.json"
-    if not meta_path.exists():
+    progress = progress_store.get(task_id)
+    if progress is not None:
+        return {**progress.meta, "progress": progress.to_dict()}
+
+    # tasks from before the last restart come from the task index
+    meta = task_store.get(task_id)
+    if meta is None:
         raise HTTPException(status_code=404, detail="Task not found.")
+    return meta
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def progress_events(task_id: str):
+    interval = 1 / progressEventRate
+    last_update = None
+    last_sent = time.monotonic()
+    while True:
+        progress = progress_store.get(task_id)
+        if progress is None:
+            return
+        if progress.state not in LIVE_STATES:
+            yield sse_event(progress.state, {**progress.meta, "progress": progress.to_dict()})
+            return
+        # progress_setter only updates the TaskProgress, changes between two
+        # checks are coalesced into a single event
+        if progress.updated_at != last_update:
+            last_update = progress.updated_at
+            last_sent = time.monotonic()
+            yield sse_event("progress", progress.to_dict())
+        elif time.monotonic() - last_sent > KEEPALIVE_INTERVAL:
+            last_sent = time.monotonic()
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(interval)
+
+
+async def final_event(meta: dict):
+    yield sse_event(meta.get("status", "finished"), meta)
+
+
+@router.get("/{task_id}/events")
+async def stream_task(task_id: str):
+    """以 Server-Sent Events 推送任务进度，任务结束后关闭"""
+    if progress_store.get(task_id) is not None:
+        events = progress_events(task_id)
+    else:
+        events = final_event(await get_task(task_id))
+
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
-    with open(meta_path, "r", encoding="utf-8") as meta_file:
-        return json.load(meta_file)
+@router.post("/{task_id}/cancel")
+async def cancel_task(task_id: str):
+    """取消排队中或运行中的任务，运行中的任务在下一个 tile 处停止"""
+    if not job_queue.cancel(task_id):
+        raise HTTPException(status_code=409, detail="Task is not queued or running.")
+    return {"status": "cancel", "id": task_id}
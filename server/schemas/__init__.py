@@ -1,2 +1,3 @@
 from .model_info import ModelInfo
+from .priority import Priority
 from .state import State
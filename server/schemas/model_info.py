@@ -7,3 +7,5 @@ class ModelInfo:
     path: str
     scale: int
     algo: str
+    # precision of the file, reduced ones are named <name>.<variant>.onnx next to the fp32 model
+    variant: str = "fp32"
@@ -0,0 +1,4 @@
+from typing import Literal
+
+
+Priority = Literal["high", "normal", "low"]
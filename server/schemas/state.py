@@ -1,4 +1,4 @@
 from typing import Literal
 
 
-State = Literal["idle", "processing", "finished", "error", "cancel"]
+State = Literal["idle", "queued", "processing", "paused", "finished", "error", "cancel"]
@@ -1,12 +1,150 @@
-import cv2
 import torch
 import torch.nn as nn
-import numpy as np
+import torch.nn.functional as F
+
+# Batched, device resident versions of the cv2 based edge losses.
+# The forward values match cv2 on the uint8 image (the old losses truncated
+# the batch with .astype('uint8')), the gradients come from the same ops on
+# the unquantized batch through a straight-through estimator.
+
+# cv2.cvtColor RGB2GRAY fixed point weights, 15 bit
+GRAY_WEIGHTS = (9798, 19235, 3735)
+GRAY_SHIFT = 15
+# cv2.Canny direction test, tan(22.5 deg) in 15 bit fixed point
+CANNY_SHIFT = 15
+TG22 = 13573
+
+SOBEL_K1 = ([[0, 0, 0], [-1, 0, 1], [0, 0, 0]], [[0, -1, 0], [0, 0, 0], [0, 1, 0]])
+SOBEL_K3 = ([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], [[-1, -2, -1], [0, 0, 0], [1, 2, 1]])
+
+
+def straight_through(hard, soft):
+    """hard in the forward pass, the gradient of soft in the backward pass"""
+    return soft + (hard - soft).detach()
+
+
+def quantize(img):
+    """uint8 values of a [0,255] batch, like .astype('uint8')"""
+    # float32, the fixed point gray conversion does not fit in half precision
+    return img.detach().float().floor()
+
+
+def rgb_to_gray(img):
+    """(N,3,H,W) RGB -> (N,1,H,W), cv2 weights"""
+    r, g, b = img[:, 0:1], img[:, 1:2], img[:, 2:3]
+    return 0.299 * r + 0.587 * g + 0.114 * b
+
+
+def rgb_to_gray_uint8(img):
+    """cv2.cvtColor(RGB2GRAY) of an integer valued batch, bit exact"""
+    r, g, b = img[:, 0:1], img[:, 1:2], img[:, 2:3]
+    wr, wg, wb = GRAY_WEIGHTS
+    gray = r * wr + g * wg + b * wb + (1 << (GRAY_SHIFT - 1))
+    return torch.div(gray, 1 << GRAY_SHIFT, rounding_mode='floor')
+
+
+def gradients(img, kernels, border):
+    """x and y derivatives of every channel, one grouped convolution each"""
+    c = img.shape[1]
+    kx, ky = (torch.tensor(k, dtype=img.dtype, device=img.device).repeat(c, 1, 1, 1) for k in kernels)
+    img = F.pad(img, (1, 1, 1, 1), mode=border)
+    return F.conv2d(img, kx, groups=c), F.conv2d(img, ky, groups=c)
+
+
+def sobel_magnitude(gray, rounded=False):
+    """cv2 Sobel ksize=1 of x and y, convertScaleAbs, addWeighted 0.5/0.5"""
+    # cv2 borders are BORDER_REFLECT_101, torch 'reflect'
+    dx, dy = gradients(gray, SOBEL_K1, 'reflect')
+    mag = (dx.abs().clamp(max=255) + dy.abs().clamp(max=255)) * 0.5
+    # addWeighted rounds half to even like torch.round
+    return torch.round(mag) if rounded else mag
+
+
+def sobel_map(img):
+    """(N,1,H,W) Sobel magnitude of a [0,255] RGB batch, cv2 values, differentiable"""
+    hard = sobel_magnitude(rgb_to_gray_uint8(quantize(img)), rounded=True)
+    soft = sobel_magnitude(rgb_to_gray(img))
+    return straight_through(hard, soft)
+
+
+def dilate(mask):
+    """3x3 max filter with a reflect 101 border"""
+    return F.max_pool2d(F.pad(mask, (1, 1, 1, 1), mode='reflect'), 3, stride=1)
+
+
+def non_max_suppression(mag, dx, dy, low):
+    """cv2.Canny candidates: above low and a local maximum across the gradient direction"""
+    h, w = mag.shape[2:]
+    # the magnitude outside the image is 0
+    padded = F.pad(mag, (1, 1, 1, 1))
+
+    def at(oy, ox):
+        return padded[:, :, 1 + oy:1 + oy + h, 1 + ox:1 + ox + w]
+
+    ax = dx.abs().int()
+    ay = dy.abs().int() << CANNY_SHIFT
+    tg22x = ax * TG22
+    tg67x = tg22x + (ax << (CANNY_SHIFT + 1))
+    horizontal = ay < tg22x
+    vertical = ~horizontal & (ay > tg67x)
+    diagonal = ~horizontal & ~vertical
+    # 135 degrees when exactly one of the derivatives is negative
+    flipped = (dx < 0) ^ (dy < 0)
+
+    keep_h = (mag > at(0, -1)) & (mag >= at(0, 1))
+    keep_v = (mag > at(-1, 0)) & (mag >= at(1, 0))
+    keep_d = torch.where(
+        flipped,
+        (mag > at(-1, 1)) & (mag > at(1, -1)),
+        (mag > at(-1, -1)) & (mag > at(1, 1)),
+    )
+    local_max = (horizontal & keep_h) | (vertical & keep_v) | (diagonal & keep_d)
+    return local_max & (mag > low)
+
+
+def hysteresis(strong, weak, check_every=8):
+    """weak pixels 8-connected to a strong one, grown until nothing changes"""
+    edges = strong
+    while True:
+        previous = edges
+        for _ in range(check_every):
+            edges = weak & (F.max_pool2d(edges.float(), 3, stride=1, padding=1) > 0)
+        if torch.equal(edges, previous):
+            return edges
+
+
+def canny(img, low, high, softness=10.0):
+    """cv2.Canny(img, low, high) of a [0,255] batch, (N,1,H,W) 0/255, differentiable
+
+    aperture 3 and L1 magnitude like the cv2 defaults, multi channel images use
+    the channel with the largest magnitude of every pixel. The gradient flows
+    through the magnitude at the pixels left after non-maximum suppression.
+    """
+    low = float(int(low))
+    high = float(int(high))
+    # cv2.Canny takes the derivatives with a replicated border
+    dx, dy = gradients(quantize(img), SOBEL_K3, 'replicate')
+    mag = dx.abs() + dy.abs()
+    channel = mag.argmax(dim=1, keepdim=True)
+    mag = mag.gather(1, channel)
+    dx = dx.gather(1, channel)
+    dy = dy.gather(1, channel)
+
+    candidates = non_max_suppression(mag, dx, dy, low)
+    edges = hysteresis(candidates & (mag > high), candidates)
+
+    soft_dx, soft_dy = gradients(img, SOBEL_K3, 'replicate')
+    soft_mag = (soft_dx.abs() + soft_dy.abs()).gather(1, channel)
+    soft = torch.sigmoid((soft_mag - low) / softness) * candidates
+    return straight_through(edges.to(img.dtype), soft) * 255
 
 
 class CannyEdgeLossMean(nn.Module):
-    def __init__(self):
+    def __init__(self, low=75, high=200, softness=10.0):
         super().__init__()
+        self.low = low
+        self.high = high
+        self.softness = softness
 
     def forward(self, y_pred, y_true):
 
@@ -21,27 +159,17 @@ class CannyEdgeLossMean(nn.Module):
         return loss
 
     def canny_edge_detection(self, img):
-        img = img.permute(0, 2, 3, 1).cpu().detach().numpy().astype('uint8')
-        canny = torch.tensor(
-            np.array([cv2.Canny(arr, 75, 200) for arr in img]))
-        return canny.float()
+        """(N,H,W) 0/255 edges of a (N,3,H,W) [0,255] batch"""
+        return canny(img, self.low, self.high, self.softness)[:, 0]
 
 
 class SobelLossMean(nn.Module):
     def __init__(self):
         super().__init__()
 
-    def sobel_xy(self, img):
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        sobelx = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=1))
-        sobely = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=1))
-        sobelxy = cv2.addWeighted(sobelx, 0.5, sobely, 0.5, 0)
-        return sobelxy
-
     def sobel_batch(self, imgs):
-        imgs = imgs.permute(0, 2, 3, 1).cpu().detach().numpy().astype('uint8')
-        sobel = torch.tensor(np.array([self.sobel_xy(img) for img in imgs]))
-        return sobel.float()
+        """(N,H,W) Sobel magnitude of a (N,3,H,W) [0,255] RGB batch"""
+        return sobel_map(imgs)[:, 0]
 
     def forward(self, y_pred, y_true):
         y_pred = torch.mul(y_pred, 255).clamp(0, 255)
@@ -54,30 +182,24 @@ class SobelLossMean(nn.Module):
 
 
 class ColorSobelLossMean(nn.Module):
-    def __init__(self):
+    def __init__(self, threshold=10, softness=2.0):
         super().__init__()
-
-    def sobel_xy(self, img):
-        img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
-        sobelx = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=1))
-        sobely = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=1))
-        sobelxy = cv2.addWeighted(sobelx, 0.5, sobely, 0.5, 0)
-        return sobelxy
+        self.threshold = threshold
+        self.softness = softness
 
     def extract_color_area(self, sobelxy, rgb_img):
-        _, mask = cv2.threshold(sobelxy, 10, 255, cv2.THRESH_BINARY)
-        sobelxy_smooth = cv2.GaussianBlur(mask, (3, 3), 0)
-        masked_image = cv2.bitwise_and(rgb_img, rgb_img, mask=sobelxy_smooth)
-        return masked_image
+        """rgb_img where the Sobel magnitude of the pixel or a neighbour is above threshold"""
+        # cv2.threshold + 3x3 GaussianBlur + bitwise_and keep every pixel next to one above threshold
+        hard = dilate((sobelxy.detach() > self.threshold).to(sobelxy.dtype))
+        soft = dilate(torch.sigmoid((sobelxy - self.threshold) / self.softness))
+        mask = straight_through(hard, soft)
+        return straight_through(quantize(rgb_img), rgb_img) * mask
 
     def color_sobel_batch(self, imgs):
-        imgs = imgs.permute(0, 2, 3, 1).cpu().detach().numpy().astype('uint8')
-        sobel_arr = [self.sobel_xy(img) for img in imgs]
-        color_edge_arr = [self.extract_color_area(
-            sobelxy, img) for (sobelxy, img) in zip(sobel_arr, imgs)]
-        sobel = torch.tensor(np.array(sobel_arr))
-        color_edge = torch.tensor(np.array(color_edge_arr))
-        return sobel.float(), color_edge.float()
+        """(N,H,W) Sobel magnitude and (N,3,H,W) edge colors of a (N,3,H,W) [0,255] RGB batch"""
+        sobel = sobel_map(imgs)
+        color_edge = self.extract_color_area(sobel, imgs)
+        return sobel[:, 0], color_edge
 
     def forward(self, y_pred, y_true):
         y_pred = torch.mul(y_pred, 255).clamp(0, 255)
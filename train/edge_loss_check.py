@@ -0,0 +1,158 @@
+"""Check the tensor edge losses against the cv2 versions and time both.
+
+Runs the cv2 implementations the losses replaced and the tensor ones on the
+same batches of shapes, blur and noise. Exits with status 1 when a Sobel or
+color edge map differs, when fewer Canny pixels than --min-agreement agree,
+or when a loss gives no gradient. Then times forward + backward steps per
+second of each loss against the cv2 forward pass.
+
+    python edge_loss_check.py --batch 8 --size 128 --device cpu
+"""
+
+import argparse
+import sys
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from edge_loss import CannyEdgeLossMean, ColorSobelLossMean, SobelLossMean
+
+
+def to_uint8(imgs):
+    return imgs.permute(0, 2, 3, 1).cpu().detach().numpy().astype('uint8')
+
+
+def cv2_canny(imgs):
+    return torch.tensor(np.array([cv2.Canny(arr, 75, 200) for arr in to_uint8(imgs)])).float()
+
+
+def cv2_sobel_xy(img):
+    img = cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+    sobelx = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_64F, 1, 0, ksize=1))
+    sobely = cv2.convertScaleAbs(cv2.Sobel(img, cv2.CV_64F, 0, 1, ksize=1))
+    return cv2.addWeighted(sobelx, 0.5, sobely, 0.5, 0)
+
+
+def cv2_sobel(imgs):
+    return torch.tensor(np.array([cv2_sobel_xy(img) for img in to_uint8(imgs)])).float()
+
+
+def cv2_color_sobel(imgs):
+    """(N,H,W) Sobel and (N,3,H,W) edge colors, channels first like ColorSobelLossMean"""
+    sobel_arr, color_edge_arr = [], []
+    for img in to_uint8(imgs):
+        sobelxy = cv2_sobel_xy(img)
+        _, mask = cv2.threshold(sobelxy, 10, 255, cv2.THRESH_BINARY)
+        mask = cv2.GaussianBlur(mask, (3, 3), 0)
+        sobel_arr.append(sobelxy)
+        color_edge_arr.append(cv2.bitwise_and(img, img, mask=mask))
+    color_edge = torch.tensor(np.array(color_edge_arr)).permute(0, 3, 1, 2)
+    return torch.tensor(np.array(sobel_arr)).float(), color_edge.float()
+
+
+def make_batch(n, size, seed):
+    """(N,3,H,W) [0,1] batch of filled circles and outlined rectangles, blurred, with noise"""
+    rng = np.random.default_rng(seed)
+    imgs = []
+    for i in range(n):
+        img = np.full((size, size, 3), rng.integers(0, 256, 3), dtype=np.uint8)
+        for _ in range(4):
+            color = tuple(int(v) for v in rng.integers(0, 256, 3))
+            center = tuple(int(v) for v in rng.integers(0, size, 2))
+            cv2.circle(img, center, int(rng.integers(size // 16, size // 3)), color, -1)
+            corner = rng.integers(0, size, 2)
+            cv2.rectangle(img, tuple(int(v) for v in corner), tuple(int(v) for v in corner + size // 4), color, 2)
+        img = cv2.GaussianBlur(img, (5, 5), 1.5)
+        noise = 20 * (i % 3)
+        img = np.clip(img.astype(np.int32) + rng.integers(-noise, noise + 1, img.shape), 0, 255).astype(np.uint8)
+        imgs.append(img)
+    return torch.tensor(np.array(imgs)).permute(0, 3, 1, 2).float() / 255
+
+
+def check(pred, true, min_agreement):
+    ok = True
+    scaled = torch.mul(pred, 255).clamp(0, 255)
+
+    canny = CannyEdgeLossMean()
+    agreement = (canny.canny_edge_detection(scaled).cpu() == cv2_canny(scaled)).float().mean().item()
+    print(f"canny agreement {agreement:.6f}")
+    ok &= agreement >= min_agreement
+
+    sobel_diff = (SobelLossMean().sobel_batch(scaled).cpu() - cv2_sobel(scaled)).abs().max().item()
+    print(f"sobel max diff {sobel_diff}")
+    ok &= sobel_diff == 0
+
+    sobel, color_edge = ColorSobelLossMean().color_sobel_batch(scaled)
+    ref_sobel, ref_color_edge = cv2_color_sobel(scaled)
+    color_diff = max((sobel.cpu() - ref_sobel).abs().max().item(), (color_edge.cpu() - ref_color_edge).abs().max().item())
+    print(f"color sobel max diff {color_diff}")
+    ok &= color_diff == 0
+
+    for loss_fn in (CannyEdgeLossMean(), SobelLossMean(), ColorSobelLossMean()):
+        x = pred.clone().requires_grad_()
+        loss = loss_fn(x, true)
+        losses = loss if isinstance(loss, tuple) else (loss,)
+        sum(losses).backward()
+        grad = x.grad.abs().sum().item()
+        print(f"{type(loss_fn).__name__} loss {[round(v.item(), 6) for v in losses]} grad {grad:.6g}")
+        ok &= grad > 0
+    return ok
+
+
+def steps_per_second(step, seconds):
+    step()
+    steps = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        step()
+        steps += 1
+    return steps / (time.perf_counter() - start)
+
+
+def bench(pred, true, seconds):
+    scale = lambda x: torch.mul(x, 255).clamp(0, 255)  # noqa: E731
+    cv2_losses = {
+        "CannyEdgeLossMean": lambda: torch.mean(torch.abs((cv2_canny(scale(pred)) - cv2_canny(scale(true))) / 255)),
+        "SobelLossMean": lambda: torch.mean(torch.abs((cv2_sobel(scale(pred)) - cv2_sobel(scale(true))) / 255)),
+        "ColorSobelLossMean": lambda: [
+            torch.mean(torch.abs((p - t) / 255)) for p, t in zip(cv2_color_sobel(scale(pred)), cv2_color_sobel(scale(true)))
+        ],
+    }
+    for loss_fn in (CannyEdgeLossMean(), SobelLossMean(), ColorSobelLossMean()):
+        name = type(loss_fn).__name__
+        x = pred.clone().requires_grad_()
+
+        def step():
+            loss = loss_fn(x, true)
+            sum(loss if isinstance(loss, tuple) else (loss,)).backward()
+            if x.device.type == "cuda":
+                torch.cuda.synchronize()
+
+        tensor_rate = steps_per_second(step, seconds)
+        # the cv2 losses have no gradient, forward only
+        cv2_rate = steps_per_second(cv2_losses[name], seconds)
+        print(f"{name:20s} tensor {tensor_rate:8.2f} steps/s  cv2 {cv2_rate:8.2f} steps/s  x{tensor_rate / cv2_rate:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch", type=int, default=8)
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--min-agreement", type=float, default=0.999)
+    args = parser.parse_args()
+
+    pred = make_batch(args.batch, args.size, 0).to(args.device)
+    true = make_batch(args.batch, args.size, 1).to(args.device)
+    ok = check(pred, true, args.min_agreement)
+    bench(pred, true, args.seconds)
+    if not ok:
+        print("tensor losses differ from cv2")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()